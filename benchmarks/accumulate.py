@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+"""Time to build a sum of n terms with ``expr += term``, as a tree and
+inside ``linear_form()``. Both should grow linearly with n.
+
+Run from the project root::
+
+    python benchmarks/accumulate.py
+"""
+
+import time
+
+import friendlysam as fs
+
+SIZES = (2000, 4000, 8000, 16000)
+
+
+def accumulate(n):
+    """Seconds to build ``2 * x(0) + ... + 2 * x(n-1)`` term by term, and hash it."""
+    x = fs.VariableCollection('x')
+    start = time.perf_counter()
+    expr = 0
+    for i in range(n):
+        expr += 2 * x(i)
+    hash(expr)
+    return time.perf_counter() - start
+
+
+def main():
+    print('{:>8} {:>9} {:>9}'.format('terms', 'tree', 'linear'))
+    for n in SIZES:
+        tree = accumulate(n)
+        with fs.linear_form():
+            linear = accumulate(n)
+        print('{:>8} {:>7.3f} s {:>7.3f} s'.format(n, tree, linear))
+
+
+if __name__ == '__main__':
+    main()
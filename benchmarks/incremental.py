@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+"""Time PulpSolver spends building its PuLP model in a rolling-horizon
+run, with and without the ``incremental`` option.
+
+Each call to :meth:`MyopicDispatchModel.advance` removes the constraints
+of the time steps that left the horizon, and any removal makes the
+incremental solver rebuild its PuLP model from the PuLP constraints it
+already has. This shows what that costs, compared to evaluating all
+constraints again.
+
+Run from the project root::
+
+    python benchmarks/incremental.py
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+import friendlysam as fs
+from friendlysam.models import MyopicDispatchModel
+from friendlysam.solvers.pulpengine import PulpSolver
+
+RESOURCE = 'power'
+UNITS = 40
+HORIZON = 48
+STEP = 4
+ADVANCES = 6
+
+
+class Unit(fs.Node):
+    def __init__(self, capacity, cost, **kwargs):
+        super().__init__(**kwargs)
+        with fs.namespace(self):
+            self.power = fs.VariableCollection('power', lb=0, ub=capacity)
+        self.production[RESOURCE] = self.power
+        self.cost = lambda t: cost * self.power(t)
+        self.constraints += lambda t: self.power(t) - self.power(self.step_time(t, -1)) <= capacity / 2
+
+    def state_variables(self, t):
+        return (self.power(t),)
+
+
+class Demand(fs.Node):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.consumption[RESOURCE] = lambda t: 500 + 10 * (t % 24)
+
+    def state_variables(self, t):
+        return ()
+
+
+@contextmanager
+def quiet_solver():
+    # CBC writes its log straight to file descriptor 1.
+    saved = os.dup(1)
+    with open(os.devnull, 'w') as devnull:
+        os.dup2(devnull.fileno(), 1)
+    try:
+        yield
+    finally:
+        os.dup2(saved, 1)
+        os.close(saved)
+
+
+def timed(func, totals, key):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            totals[key] += time.perf_counter() - start
+    return wrapper
+
+
+def model_time(incremental):
+    """Seconds spent in updating and rebuilding the PuLP model, in total."""
+    totals = dict(update=0., rebuild=0.)
+    solver = fs.get_solver(options=dict(incremental=incremental))
+    solver._update_model = timed(solver._update_model, totals, 'update')
+    solver._rebuild_model = timed(solver._rebuild_model, totals, 'rebuild')
+
+    model = MyopicDispatchModel(t0=0, horizon=HORIZON, step=STEP, reuse_constraints=True)
+    model.require_cost = lambda part: isinstance(part, Unit)
+    units = [Unit(capacity=20 + i, cost=10 + i, name='Unit {}'.format(i)) for i in range(UNITS)]
+    for unit in units:
+        unit.power(-1).value = 0
+    model.add_part(fs.Cluster(Demand(), *units, resource=RESOURCE))
+    model.solver = solver
+    with quiet_solver():
+        model.advance() # The first model is always built from scratch.
+        for key in totals:
+            totals[key] = 0.
+        for i in range(ADVANCES):
+            model.advance()
+    return totals
+
+
+def main():
+    print('{} units, horizon {}, step {}, {} advances'.format(UNITS, HORIZON, STEP, ADVANCES))
+    for incremental in (False, True):
+        totals = model_time(incremental)
+        print('{:<12} {:>7.2f} s, of which rebuilding {:.2f} s'.format(
+            'incremental' if incremental else 'from scratch', totals['update'], totals['rebuild']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+"""Memory used per object by variables, expressions and constraints.
+
+Run from the project root::
+
+    python benchmarks/memory.py
+"""
+
+import gc
+import tracemalloc
+
+import friendlysam as fs
+
+N = 100000
+
+
+def bytes_per_object(make):
+    """Average number of bytes allocated per object created by ``make(i)``."""
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    objects = [make(i) for i in range(N)]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    list_size = len(objects) * 8 # The list holding the objects
+    return (after - before - list_size) / N
+
+
+def main():
+    x = fs.VariableCollection('x')
+    variables = [x(i) for i in range(N)]
+    cases = [
+        ('Variable', lambda i: fs.Variable(name='v', lb=0, ub=1)),
+        ('Add', lambda i: fs.Add(variables[i], 1)),
+        ('Mul', lambda i: fs.Mul(variables[i], 2)),
+        ('LessEqual', lambda i: fs.LessEqual(variables[i], 3)),
+        ('Constraint', lambda i: fs.Constraint(None, desc='desc')),
+    ]
+    for name, make in cases:
+        print('{:<12} {:>7.1f} bytes'.format(name, bytes_per_object(make)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+"""Solve time of a rolling-horizon unit commitment model, with and
+without warm start.
+
+The model is scheduled day-ahead: Each call to
+:meth:`MyopicDispatchModel.advance` fixes one day and optimizes over two.
+The demand has the same profile every day, so the start values of the new
+day, copied from the day before, are feasible, and CBC can use the start
+as its first solution. The number of solves where CBC reports that it did
+is printed. MIP starts need PuLP 2.0 or later; with older versions, the
+warm start has no effect.
+
+Run from the project root::
+
+    python benchmarks/warm_start.py
+"""
+
+import math
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+import friendlysam as fs
+from friendlysam.models import MyopicDispatchModel
+
+RESOURCE = 'power'
+UNITS = 20
+HORIZON = 48
+STEP = 24
+ADVANCES = 4
+
+
+class Unit(fs.Node):
+    """A power plant which has a minimum load when it is on."""
+
+    def __init__(self, capacity, min_load, cost, start_cost, **kwargs):
+        super().__init__(**kwargs)
+        with fs.namespace(self):
+            self.power = fs.VariableCollection('power', lb=0)
+            self.on = fs.VariableCollection('on', domain=fs.Domain.binary)
+            self.start = fs.VariableCollection('start', lb=0, ub=1)
+        self.production[RESOURCE] = self.power
+        self.cost = lambda t: cost * self.power(t) + start_cost * self.start(t)
+        self.constraints += [
+            lambda t: self.power(t) <= capacity * self.on(t),
+            lambda t: self.power(t) >= min_load * self.on(t),
+            lambda t: self.start(t) >= self.on(t) - self.on(self.step_time(t, -1))]
+
+    def state_variables(self, t):
+        return (self.power(t), self.on(t), self.start(t))
+
+
+class Demand(fs.Node):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        scale = UNITS / 8
+        self.consumption[RESOURCE] = lambda t: scale * (300 + 150 * math.sin(t * math.pi / 12))
+
+    def state_variables(self, t):
+        return ()
+
+
+def make_model(warm_start):
+    model = MyopicDispatchModel(t0=0, horizon=HORIZON, step=STEP, warm_start=warm_start)
+    model.require_cost = lambda part: isinstance(part, Unit)
+    units = [
+        Unit(capacity=40 + 10 * i, min_load=15 + 3 * i, cost=10 + 2 * i,
+             start_cost=200 + 50 * i, name='Unit {}'.format(i))
+        for i in range(UNITS)]
+    for unit in units:
+        unit.on(-1).value = 0
+    model.add_part(fs.Cluster(Demand(), *units, resource=RESOURCE))
+    model.solver = fs.get_solver()
+    return model
+
+
+@contextmanager
+def solver_log(lines):
+    # Collect the lines that CBC writes to file descriptor 1.
+    saved = os.dup(1)
+    with tempfile.TemporaryFile('w+') as log:
+        os.dup2(log.fileno(), 1)
+        try:
+            yield
+        finally:
+            os.dup2(saved, 1)
+            os.close(saved)
+            log.seek(0)
+            lines.extend(log.read().splitlines())
+
+
+def solve_time(warm_start):
+    """Total time of :meth:`MyopicDispatchModel.advance` calls, in seconds,
+    and the number of solves where CBC used the start."""
+    model = make_model(warm_start)
+    lines = []
+    with solver_log(lines):
+        model.advance() # The first solve is never warm.
+        start = time.perf_counter()
+        for i in range(ADVANCES):
+            model.advance()
+        elapsed = time.perf_counter() - start
+    used = sum(1 for line in lines if 'MIPStart provided solution' in line)
+    return elapsed, used
+
+
+def main():
+    print('{} units, horizon {}, step {}, {} advances'.format(UNITS, HORIZON, STEP, ADVANCES))
+    for warm_start in (False, True):
+        elapsed, used = solve_time(warm_start)
+        print('{:<6} {:>7.2f} s, start used in {} solves'.format(
+            'warm' if warm_start else 'cold', elapsed, used))
+
+
+if __name__ == '__main__':
+    main()
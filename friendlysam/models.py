@@ -3,19 +3,145 @@
 import logging
 logger = logging.getLogger(__name__)
 
+import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from itertools import chain, product
 
+try:
+    import dill
+except ImportError:
+    dill = None
+
 import friendlysam as fs
 from friendlysam.compat import ignored
+from friendlysam.parts import ConstraintCollection, _map, _merge
+
+
+class _ConstraintCache(object):
+    """The constraints made for one part, by index.
+
+    Constraints from ordinary constraint functions are kept per index.
+    Constraints from batched functions are kept per index too, if their
+    ``origin`` says they are for a single index, like the balance
+    constraints of nodes. Other batched constraints are kept per call,
+    and the whole call is made again when any of its indices expires.
+    """
+
+    def __init__(self, part, funcs):
+        super().__init__()
+        self.part = part
+        self.funcs = funcs
+        self.revision = part._constraints_revision
+        self.has_batched = any(is_batched for func, is_batched in funcs)
+        self.single = {}
+        self.batched = {}
+        self.batched_calls = []
+
+    def expire(self, times):
+        live = set(times)
+        for index in [index for index in self.single if index not in live]:
+            del self.single[index]
+
+        calls = []
+        for indices, constraints in self.batched_calls:
+            if live.issuperset(indices):
+                calls.append((indices, constraints))
+            else:
+                for index in indices:
+                    self.batched.pop(index, None)
+        self.batched_calls = calls
+        for index in [index for index in self.batched if index not in live]:
+            del self.batched[index]
+
+    def make_batched(self, times):
+        indices = tuple(index for index in times if index not in self.batched)
+        if not indices:
+            return
+        for index in indices:
+            self.batched[index] = []
+        if not self.has_batched:
+            return
+
+        todo = set(indices)
+        rest = []
+        for constraint in self.part.constraints._make_batched(indices):
+            origin = constraint.origin
+            if (type(origin) is ConstraintCollection._origin_tuple and
+                    origin.owner is self.part and origin.index in todo):
+                self.batched[origin.index].append(constraint)
+            else:
+                rest.append(constraint)
+        if rest:
+            self.batched_calls.append((indices, rest))
+
+    def batched_lists(self, times):
+        for index in times:
+            yield self.batched[index]
+        for indices, constraints in self.batched_calls:
+            yield constraints
+
 
 class MyopicDispatchModel(fs.Part):
-    """docstring for MyopicDispatchModel"""
-    def __init__(self, t0=None, horizon=None, step=None, name=None, require_cost=True):
+    """A model which is optimized over a rolling horizon.
+
+    Each call to :meth:`advance` optimizes the model over ``horizon``
+    time steps from :attr:`time`, fixes the :meth:`state_variables` of
+    all parts for the first ``step`` time steps, and moves :attr:`time`
+    forward by ``step``.
+
+    Args:
+        t0 (optional): The start time.
+        horizon (optional): The number of time steps to optimize over.
+        step (optional): The number of time steps to advance each time.
+        name (str, optional): The name of the model.
+        require_cost (boolean or callable, optional): Either ``True``, to
+            sum the cost of all parts, or a function ``f(part)`` which
+            is true for the parts whose cost should be included.
+        executor (``concurrent.futures.Executor``, optional): Passed on to
+            :meth:`~friendlysam.parts.Part.make_constraints`.
+        reuse_constraints (boolean, optional): Keep the constraints made
+            for each part and time step, and only make constraints for the
+            time steps that entered the horizon since the last call to
+            :meth:`advance`. This assumes that constraint functions give
+            the same constraints each time they are called with the same
+            index. The cache is cleared for a part if its constraint
+            functions change, if parts are added to or removed from it,
+            and for nodes, if their ``production``, ``consumption`` or
+            ``accumulation`` dicts change, if they join or leave a
+            :class:`~friendlysam.parts.Cluster`, or if they are connected
+            by a :class:`~friendlysam.parts.FlowNetwork`. Other changes
+            that constraint functions depend on, like an attribute they
+            read, are not noticed, so only turn this on for models which
+            make no such changes between calls to :meth:`advance`. Default
+            is ``False``.
+        warm_start (boolean, optional): Pass a start solution to the
+            solver, made from the solution of the previous horizon. Variables
+            that were in the previous problem start at their previous values.
+            The :meth:`state_variables` of the time steps that entered the
+            horizon start at the values of the time steps ``step`` steps
+            earlier, found with :meth:`step_time`. The :attr:`solver` must
+            accept a ``start`` argument, like
+            :class:`~friendlysam.solvers.pulpengine.PulpSolver`, which needs
+            PuLP 2.0 or later for this. With the PuLP 1.5.8 that
+            friendlysam is installed with, it has no effect. The solver may
+            also ignore a start that it cannot make a feasible solution
+            from, e.g. if the new time steps are not like the ones ``step``
+            steps earlier. See ``benchmarks/warm_start.py``. Default is
+            ``False``.
+    """
+    def __init__(self, t0=None, horizon=None, step=None, name=None, require_cost=True,
+                 executor=None, reuse_constraints=False, warm_start=False):
         super().__init__(name=name)
         self.horizon = horizon
         self.step = step
         self.time = t0
         self.require_cost = require_cost
+        self.executor = executor
+        self.reuse_constraints = reuse_constraints
+        self._constraint_caches = {}
+        self.warm_start = warm_start
+        self._last_solution = None
     
     def state_variables(self, t):
         return tuple()
@@ -43,12 +169,171 @@ class MyopicDispatchModel(fs.Part):
 
         problem = fs.Problem()
         problem.objective = fs.Minimize(system_cost)
-        problem += (p.constraints.make(t) for p, t in product(parts, opt_times))
+        problem += self._make_constraints(opt_times)
 
-        solution = self.solver.solve(problem)
+        if self.warm_start and self._last_solution is not None:
+            start = self._start_solution(parts, opt_times)
+            solution = self.solver.solve(problem, start=start)
+        else:
+            solution = self.solver.solve(problem)
+        self._last_solution = solution
 
-        for p, t in product(parts, self.iter_times(self.time, self.step)):
-            for v in p.state_variables(t):
-                v.take_value(solution)
+        self.apply_solution(solution, self.iter_times(self.time, self.step))
 
         self.time = self.step_time(self.time, self.step)
+
+    def _start_solution(self, parts, opt_times):
+        # The previous solution, with the state variables of the new time
+        # steps at the end of the horizon set from the time steps `step`
+        # steps earlier.
+        last = self._last_solution
+        start = dict(last)
+        for p, t in product(parts, opt_times[-self.step:]):
+            earlier = p.step_time(t, -self.step)
+            for v, w in zip(p.state_variables(t), p.state_variables(earlier)):
+                if v not in start and w in last:
+                    start[v] = last[w]
+        return start
+
+    def _make_constraints(self, times):
+        # Like self.make_constraints(times), but reusing the constraints
+        # made in earlier calls to advance().
+        if not self.reuse_constraints:
+            self._constraint_caches = {}
+            return self.make_constraints(times, executor=self.executor)
+
+        times = tuple(times)
+        parts = sorted(self.descendants_and_self, key=lambda part: part._creation_order)
+        caches = []
+        for part in parts:
+            funcs = tuple(part.constraints._constraint_funcs.items())
+            cache = self._constraint_caches.get(part)
+            if (cache is None or cache.funcs != funcs or
+                    cache.revision != part._constraints_revision):
+                cache = _ConstraintCache(part, funcs)
+            cache.expire(times)
+            caches.append(cache)
+        self._constraint_caches = {cache.part: cache for cache in caches}
+
+        calls = [(cache, index) for index in times for cache in caches
+                 if index not in cache.single]
+        lists = _map(lambda call: call[0].part.constraints._make_list(call[1]), calls, self.executor)
+        for (cache, index), constraints in zip(calls, lists):
+            cache.single[index] = constraints
+
+        for cache in caches:
+            cache.make_batched(times)
+
+        return _merge(chain(
+            (cache.single[index] for index in times for cache in caches),
+            chain.from_iterable(cache.batched_lists(times) for cache in caches)))
+
+
+class _LimitedSolver(object):
+    """Wraps a solver, so that it only solves when the semaphore allows."""
+
+    def __init__(self, solver, semaphore):
+        super().__init__()
+        self.solver = solver
+        self.semaphore = semaphore
+
+    def solve(self, problem, **kwargs):
+        with self.semaphore:
+            return self.solver.solve(problem, **kwargs)
+
+
+# The semaphore limiting the number of solves running at once, in worker
+# processes of run_scenarios().
+_solver_semaphore = None
+
+def _init_worker(semaphore):
+    global _solver_semaphore
+    _solver_semaphore = semaphore
+
+
+def _run_scenario(payload):
+    factory, params, advances, result = dill.loads(payload)
+    model = factory(params)
+    if _solver_semaphore is not None:
+        model.solver = _LimitedSolver(model.solver, _solver_semaphore)
+    for i in range(advances):
+        model.advance()
+    if result is None:
+        model.solver = None
+        output = model
+    else:
+        output = result(model)
+    return dill.dumps(output)
+
+
+def run_scenarios(factory, scenarios, advances, result=None, max_workers=None, max_solvers=None):
+    """Run a model for many scenarios, in a pool of processes.
+
+    Each scenario is run in a worker process: The model is created by
+    ``factory(params)``, then :meth:`MyopicDispatchModel.advance` is called
+    ``advances`` times, and the output is sent back. The functions and
+    their outputs are sent between processes with ``dill``, so they may
+    be lambdas, and the models may contain anything that can be pickled
+    with ``dill``.
+
+    The results are yielded as soon as each scenario is done, so they come
+    in no particular order.
+
+    Args:
+        factory (callable): A function ``factory(params)`` returning a model,
+            with a :attr:`solver`.
+        scenarios (dict or iterable): The parameters of each scenario.
+            If a ``dict``, the keys name the scenarios. Otherwise, the
+            scenarios are named by their position.
+        advances (int): The number of times to advance each model.
+        result (callable, optional): A function ``result(model)`` returning
+            the output of a scenario. By default, the output is the model
+            itself, with its :attr:`solver` set to ``None``.
+        max_workers (int, optional): The number of processes. Passed on
+            to ``concurrent.futures.ProcessPoolExecutor``.
+        max_solvers (int, optional): The largest number of solves running
+            at once, in all processes together. Solvers like CBC run in
+            their own processes, so this may be used to leave room for
+            them.
+
+    Yields:
+        ``(name, output)`` for each scenario.
+
+    Raises:
+        Any exception raised in a scenario, when its result is reached.
+        The scenarios that have not yet started are then cancelled.
+
+    Examples:
+
+        def factory(params):
+            model = make_my_model(**params)
+            model.solver = fs.get_solver()
+            return model
+
+        scenarios = {'cold': dict(temperature=-10), 'warm': dict(temperature=10)}
+        results = run_scenarios(
+            factory, scenarios, advances=8760 // 24,
+            result=lambda model: model.total_cost(),
+            max_workers=8, max_solvers=4)
+        for name, cost in results:
+            print(name, cost)
+
+    """
+    if dill is None:
+        raise RuntimeError('dill is needed for this function').with_traceback(sys.exc_info()[2])
+
+    scenarios = scenarios.items() if isinstance(scenarios, dict) else enumerate(scenarios)
+    semaphore = None if max_solvers is None else multiprocessing.Semaphore(max_solvers)
+
+    with ProcessPoolExecutor(
+            max_workers, initializer=_init_worker, initargs=(semaphore,)) as executor:
+        futures = {}
+        try:
+            for name, params in scenarios:
+                payload = dill.dumps((factory, params, advances, result))
+                futures[executor.submit(_run_scenario, payload)] = name
+            for future in as_completed(futures):
+                yield futures[future], dill.loads(future.result())
+        finally:
+            for future in futures:
+                future.cancel()
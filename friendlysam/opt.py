@@ -6,13 +6,23 @@ import logging
 logger = logging.getLogger(__name__)
 import sys
 import operator
-from functools import reduce
+import threading
+import weakref
+from functools import reduce, lru_cache
 
+from array import array
+from collections.abc import Mapping, MutableSet
 from contextlib import contextmanager
+from contextvars import ContextVar
 from itertools import chain
 from enum import Enum
 import numbers
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 import friendlysam as fs
 from friendlysam.compat import ignored
 from friendlysam.util import _short_default_repr
@@ -47,6 +57,91 @@ def namespace(name):
     _namespace_string = old
 
 
+# Whether linear_form() is on, in the current thread or task.
+_linear_form = ContextVar('linear_form', default=False)
+
+@contextmanager
+def linear_form(enabled=True):
+    """Collapse linear arithmetic into :class:`LinearExpr` objects.
+
+    Inside this context, adding, subtracting, and multiplying by numbers,
+    as well as :class:`Sum` and :func:`dot`, produce a flat
+    :class:`LinearExpr` instead of a tree of :class:`Add`, :class:`Sub`,
+    :class:`Mul` and :class:`Sum` objects, whenever all the terms are linear.
+    Anything non-linear is still built as an ordinary expression tree.
+
+    The setting only applies to the current thread or ``asyncio`` task.
+    :meth:`~friendlysam.parts.Part.make_constraints` and
+    :meth:`~friendlysam.parts.ConstraintCollection.make_many` pass it on
+    to the threads of their executor.
+
+    Args:
+        enabled (boolean, optional): Set to ``False`` to temporarily turn
+            linear form off inside an enclosing ``linear_form()`` context.
+
+    Examples:
+
+        >>> x, y = Variable('x'), Variable('y')
+        >>> with linear_form():
+        ...     expr = 2 * (x + y) - y + 1
+        ...
+        >>> expr
+        <friendlysam.opt.LinearExpr at 0x...>
+        >>> print(expr)
+        2 * x + y + 1
+        >>> print(2 * (x + y) - y + 1)
+        2 * (x + y) - y + 1
+    """
+    token = _linear_form.set(enabled)
+    try:
+        yield
+    finally:
+        _linear_form.reset(token)
+
+
+# Whether interning() is on, in the current thread or task.
+_interning = ContextVar('interning', default=False)
+
+@contextmanager
+def interning(enabled=True):
+    """Share one object between structurally equal expressions.
+
+    Inside this context, creating an operation which is structurally
+    equal to a live operation, with the same argument objects, gives back
+    the live one instead of a new object. This saves memory in models
+    which make the same subexpressions many times, and makes comparisons
+    of such expressions an identity check. It costs a table lookup for
+    each new operation, and a table entry for each live one, so it only
+    pays off if there are many duplicates.
+
+    Like :func:`linear_form`, the setting only applies to the current
+    thread or ``asyncio`` task.
+
+    Args:
+        enabled (boolean, optional): Set to ``False`` to temporarily turn
+            interning off inside an enclosing ``interning()`` context.
+
+    Examples:
+
+        >>> x = Variable('x')
+        >>> x * 2 is x * 2
+        False
+        >>> with interning():
+        ...     x * 2 is x * 2
+        ...
+        True
+        >>> with interning():
+        ...     x * 2 is x * 2.0 # 2 and 2.0 are not the same
+        ...
+        False
+    """
+    token = _interning.set(enabled)
+    try:
+        yield
+    finally:
+        _interning.reset(token)
+
+
 def get_solver(engine='pulp', options=None):
     """Get a solver object.
 
@@ -59,6 +154,11 @@ def get_solver(engine='pulp', options=None):
             :class:`~friendlysam.solvers.pulpengine.PulpSolver` constructor
             for details.
 
+            If ``engine == 'pool'``, the engine is created using
+            ``PoolSolver(options)``. See
+            :class:`~friendlysam.solvers.poolengine.PoolSolver` constructor
+            for details.
+
     """
     if options is None:
         options = {}
@@ -66,6 +166,10 @@ def get_solver(engine='pulp', options=None):
     if engine == 'pulp':            
         from friendlysam.solvers.pulpengine import PulpSolver
         return PulpSolver(options)
+    elif engine == 'pool':
+        from friendlysam.solvers.poolengine import PoolSolver
+        return PoolSolver(options)
+    raise ValueError('unknown solver engine {}'.format(engine))
 
 class SolverError(Exception):
     """A generic exception raised by a solver instance."""
@@ -106,6 +210,61 @@ class Domain(Enum):
     binary = 2
 
 
+def _slot_names(cls):
+    """All the names in ``__slots__`` of a class and its bases."""
+    names = []
+    for klass in cls.__mro__:
+        slots = klass.__dict__.get('__slots__', ())
+        if isinstance(slots, str):
+            slots = (slots,)
+        names.extend(n for n in slots if n not in ('__dict__', '__weakref__'))
+    return names
+
+
+# Interned expressions, see interning(): weak references to operations,
+# keyed by the hash of (class, *args). Dead references are purged when the table has grown
+# to twice its size after the last purge.
+_interned = {}
+_interned_limit = 1024
+
+def _purge_interned():
+    global _interned_limit
+    for h, ref in list(_interned.items()):
+        if ref() is None:
+            _interned.pop(h, None)
+    _interned_limit = max(1024, 2 * len(_interned))
+
+def _same_args(args, other_args):
+    # True if interned args can stand in for other_args. Numbers must have
+    # the same type, so that e.g. x + 1 does not stand in for x + 1.0, and
+    # operations must be the same objects.
+    if len(args) != len(other_args):
+        return False
+    for a, b in zip(args, other_args):
+        if a is not b and (type(a) is not type(b) or isinstance(a, Operation) or not a == b):
+            return False
+    return True
+
+
+# Operation.evaluate() recurses this deep before it switches to a loop.
+_MAX_RECURSIVE_DEPTH = 100
+
+
+class _DeepExpression(Exception):
+    """Raised when an expression is too deep to evaluate recursively."""
+
+
+def _evaluate_leaf(arg, replace, evaluators):
+    # Evaluate an argument of an operation, which is not itself an operation.
+    try:
+        return replace[arg]
+    except KeyError:
+        try:
+            return arg.evaluate(replace=replace, evaluators=evaluators)
+        except AttributeError:
+            return arg
+
+
 class Operation(object):
     """An operation on some arguments.
 
@@ -134,14 +293,70 @@ class Operation(object):
             >>> x + 1
             <friendlysam.opt.Add at 0x...>
 
+        The hash of an operation is computed the first time it is needed,
+        and then kept.
+        Inside an :func:`interning` context, structurally equal operations
+        share one object.
+
     """
 
+    __slots__ = ('_args', '_hash', '_leaves', '_variables', '__weakref__')
+
     def __new__(cls, *args):
+        # Inside interning(), structurally equal expressions share one
+        # object, as long as it is alive. Unpickling creates objects
+        # without args, which are not interned.
+        h = None
+        if _interning.get() and args:
+            try:
+                h = hash((cls,) + args)
+            except TypeError: # Some argument is unhashable.
+                pass
+            else:
+                ref = _interned.get(h)
+                if ref is not None:
+                    obj = ref()
+                    if obj is not None and type(obj) is cls and _same_args(obj._args, args):
+                        return obj
+
         obj = super().__new__(cls)
         obj._args = args
-        obj._key = (cls,) + args
+        obj._leaves = None
+        obj._variables = None
+        if h is not None and cls._key is Operation._key:
+            obj._hash = h
+        else:
+            obj._hash = None # Computed when first needed, see __hash__.
+        if h is not None:
+            _interned[h] = weakref.ref(obj)
+            if len(_interned) > _interned_limit:
+                _purge_interned()
         return obj
 
+    @property
+    def _key(self):
+        # The identity of the expression, used for hashing and equality.
+        return (type(self),) + self._args
+
+    _unpickled_slots = frozenset(('_hash', '_leaves', '_variables'))
+
+    def __getstate__(self):
+        # Hashes of variables are not stable across pickling, so the
+        # cached hash must be recomputed on unpickling. The cached leaves
+        # are simply dropped.
+        state = dict(getattr(self, '__dict__', {}))
+        for name in _slot_names(type(self)):
+            if name not in self._unpickled_slots and hasattr(self, name):
+                state[name] = getattr(self, name)
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._hash = None
+        self._leaves = None
+        self._variables = None
+
     @classmethod
     def create(cls, *args):
         """Classmethod to create a new object.
@@ -164,10 +379,32 @@ class Operation(object):
         return cls.__new__(cls, *args)
 
     def __hash__(self):
-        return hash(self._key)
+        h = self._hash
+        if h is None:
+            h = self._hash = self._compute_hash()
+        return h
+
+    def _compute_hash(self):
+        # Hash the operations below that have no hash yet first, bottom up
+        # with an explicit stack, so that hashing a deep expression tree does
+        # not hit the recursion limit. Raises TypeError if some argument is
+        # unhashable.
+        stack = [self]
+        while stack:
+            node = stack[-1]
+            if node._hash is not None:
+                stack.pop()
+                continue
+            unhashed = [arg for arg in node._args if isinstance(arg, Operation) and arg._hash is None]
+            if unhashed:
+                stack.extend(unhashed)
+                continue
+            stack.pop()
+            node._hash = hash(node._key)
+        return self._hash
 
     def __eq__(self, other):
-        return type(self) == type(other) and self._key == other._key
+        return self is other or (type(self) == type(other) and self._key == other._key)
 
     @property
     def args(self):
@@ -193,7 +430,7 @@ class Operation(object):
         return self._args
     
     def evaluate(self, replace=None, evaluators=None):
-        """Evaluate the expression recursively.
+        """Evaluate the expression.
 
         Evaluating an expression:
 
@@ -208,6 +445,11 @@ class Operation(object):
 
             3. Run the evaluating function ``func(*evaluated_args)`` and return the result.
 
+        The arguments which are themselves :class:`Operation` instances are
+        evaluated by recursive calls down to a depth of 100, and beyond that in a loop,
+        so there is no limit on the depth of the expression tree. Subexpressions that occur several times in the tree
+        (i.e., that compare equal) are only evaluated once per call.
+
         Args:
             replace (dict, optional): Replacements for arguments. Arguments matching keys
                 will be replaced by specified values.
@@ -233,20 +475,71 @@ class Operation(object):
             evaluators = {}
         if replace is None:
             replace = {}
+
+        results = {}
+        try:
+            return self._evaluate_recursive(replace, evaluators, results, 0)
+        except _DeepExpression:
+            pass
+
+        # Post-order traversal with an explicit stack, so that long chains
+        # of operations do not hit the recursion limit. Each distinct
+        # subexpression (in the sense of ==) is evaluated only once, and the
+        # ones already evaluated above are kept in results.
+        stack = [self]
+        while stack:
+            node = stack[-1]
+            if node in results:
+                stack.pop()
+                continue
+
+            ready = True
+            for arg in node._args:
+                if isinstance(arg, Operation) and arg not in results:
+                    try:
+                        results[arg] = replace[arg]
+                    except KeyError:
+                        stack.append(arg)
+                        ready = False
+            if not ready:
+                continue
+
+            stack.pop()
+            evaluated_args = []
+            for arg in node._args:
+                if isinstance(arg, Operation):
+                    evaluated = results[arg]
+                else:
+                    evaluated = _evaluate_leaf(arg, replace, evaluators)
+                evaluated_args.append(evaluated)
+
+            evaluator = evaluators.get(node.__class__, node.__class__.create)
+            results[node] = evaluator(*evaluated_args)
+
+        return results[self]
+
+    def _evaluate_recursive(self, replace, evaluators, results, depth):
+        # The same as the loop in evaluate(), but recursive, which is faster
+        # for the shallow expressions that are most common. Gives up by
+        # raising _DeepExpression below _MAX_RECURSIVE_DEPTH levels.
+        if depth == _MAX_RECURSIVE_DEPTH:
+            raise _DeepExpression()
         evaluated_args = []
-        for arg in self.args:
-            try:
-                evaluated = replace[arg]
-            except KeyError:
+        for arg in self._args:
+            if isinstance(arg, Operation):
                 try:
-                    evaluated = arg.evaluate(replace=replace, evaluators=evaluators)
-                except AttributeError:
-                    evaluated = arg
-            finally:
-                evaluated_args.append(evaluated)
+                    evaluated = results[arg]
+                except KeyError:
+                    try:
+                        evaluated = replace[arg]
+                    except KeyError:
+                        evaluated = arg._evaluate_recursive(replace, evaluators, results, depth + 1)
+                    results[arg] = evaluated
+            else:
+                evaluated = _evaluate_leaf(arg, replace, evaluators)
+            evaluated_args.append(evaluated)
 
         evaluator = evaluators.get(self.__class__, self.__class__.create)
-
         return evaluator(*evaluated_args)
 
     @property
@@ -272,6 +565,8 @@ class Operation(object):
     def variables(self):
         """This property gives all :attr:`leaves` which are instances of :class:`Variable`.
 
+        It is computed once and then stored, as a ``frozenset``.
+
         Examples:
 
             >>> x, y = Variable('x'), Variable('y')
@@ -279,8 +574,9 @@ class Operation(object):
             >>> expr.variables == {x, y}
             True
         """
-
-        return set(l for l in self.leaves if isinstance(l, Variable))
+        if self._variables is None:
+            self._variables = frozenset(l for l in self.leaves if isinstance(l, Variable))
+        return self._variables
 
     @property
     def leaves(self):
@@ -289,6 +585,8 @@ class Operation(object):
         The leaves of an :class:`Operation` are all the :attr:`args` which
         do not themselves have a :attr:`leaves` property.
 
+        It is computed once and then stored, as a ``frozenset``.
+
         Examples:
 
             >>> x, y = Variable('x'), Variable('y')
@@ -296,14 +594,33 @@ class Operation(object):
             >>> expr.leaves == {42, x, y, 3.5, 2}
             True
         """
-
+        if self._leaves is None:
+            self._leaves = self._collect_leaves()
+        return self._leaves
+
+    def _collect_leaves(self):
+        # Walk the tree in a loop rather than recursively. Subexpressions
+        # which already know their leaves are not walked again, but the
+        # leaves are not stored on them either; that would make a long
+        # chain of operations take quadratic time and memory.
         leaves = set()
-        for a in self._args:
-            try:
-                leaves.update(a.leaves)
-            except AttributeError:
-                leaves.add(a)
-        return leaves
+        visited = set()
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            for arg in node._args:
+                if isinstance(arg, Operation):
+                    if arg._leaves is not None:
+                        leaves.update(arg._leaves)
+                    elif id(arg) not in visited:
+                        visited.add(id(arg))
+                        stack.append(arg)
+                else:
+                    try:
+                        leaves.update(arg.leaves)
+                    except AttributeError:
+                        leaves.add(arg)
+        return frozenset(leaves)
 
     def _format_arg(self, arg):
         if isinstance(arg, (numbers.Number, Variable)):
@@ -329,23 +646,67 @@ class Operation(object):
 class _MathEnabled(object):
     """Mixin to get all the math operators overloaded."""
 
+    __slots__ = ()
+
     def __add__(self, other):
-        return self if other == 0 else Add(self, other)
+        if other == 0:
+            return self
+        if _linear_form.get():
+            try:
+                return _linear_combination((self, 1), (other, 1))
+            except TypeError:
+                pass
+        return Add(self, other)
 
     def __radd__(self, other):
-        return self if other == 0 else Add(other, self)
+        if other == 0:
+            return self
+        if _linear_form.get():
+            try:
+                return _linear_combination((other, 1), (self, 1))
+            except TypeError:
+                pass
+        return Add(other, self)
 
     def __sub__(self, other):
-        return self if other == 0 else Sub(self, other)
+        if other == 0:
+            return self
+        if _linear_form.get():
+            try:
+                return _linear_combination((self, 1), (other, -1))
+            except TypeError:
+                pass
+        return Sub(self, other)
 
     def __rsub__(self, other):
-        return -self if other == 0 else Sub(other, self)
+        if other == 0:
+            return -self
+        if _linear_form.get():
+            try:
+                return _linear_combination((other, 1), (self, -1))
+            except TypeError:
+                pass
+        return Sub(other, self)
 
     def __mul__(self, other):
-        return 0 if other == 0 else Mul(self, other)
+        if other == 0:
+            return 0
+        if _linear_form.get() and isinstance(other, numbers.Number):
+            try:
+                return _linear_combination((self, other))
+            except TypeError:
+                pass
+        return Mul(self, other)
 
     def __rmul__(self, other):
-        return 0 if other == 0 else Mul(other, self)
+        if other == 0:
+            return 0
+        if _linear_form.get() and isinstance(other, numbers.Number):
+            try:
+                return _linear_combination((self, other))
+            except TypeError:
+                pass
+        return Mul(other, self)
 
     def __truediv__(self, other):
         return self * (1/other) # Takes care of division by scalars at least
@@ -389,6 +750,7 @@ class Add(Operation, _MathEnabled):
         5.0
 
     """
+    __slots__ = ()
     _format = '{} + {}'
     _priority = 1
 
@@ -414,6 +776,7 @@ class Sub(Operation, _MathEnabled):
         -1.0
 
     """
+    __slots__ = ()
     _format = '{} - {}'
     _priority = 1
         
@@ -449,6 +812,7 @@ class Mul(Operation, _MathEnabled):
 
     """
     
+    __slots__ = ()
     _format = '{} * {}'
     _priority = 2
 
@@ -480,6 +844,7 @@ class Sum(Operation, _MathEnabled):
             <friendlysam.opt.Add at 0x...>
 
     """
+    __slots__ = ()
     _priority = 1
 
     def __new__(cls, vector):
@@ -516,6 +881,11 @@ class Sum(Operation, _MathEnabled):
             return 0
         if len(args) == 1:
             return args[0]
+        if _linear_form.get():
+            try:
+                return _linear_combination(*((arg, 1) for arg in args))
+            except TypeError:
+                pass
         return super().__new__(cls, *args)
 
 
@@ -523,6 +893,340 @@ class Sum(Operation, _MathEnabled):
         return 'Sum({})'.format(', '.join(str(a) for a in self.args))
 
 
+class _TermLog(object):
+    """The terms of linear expressions which extend one another.
+
+    ``pairs`` is an append-only list of ``(variable, coefficient)`` pairs,
+    and ``totals`` has the summed coefficients of all of them. Each
+    :class:`LinearExpr` uses the first pairs of a log. The one that uses
+    all of them may add a term by appending to the log, which is how
+    ``expr += term`` avoids copying all the terms of ``expr``.
+    """
+
+    __slots__ = ('pairs', 'totals')
+
+    def __init__(self, terms):
+        super().__init__()
+        self.pairs = list(terms.items())
+        self.totals = dict(terms)
+
+# Held while checking if a log can be extended, and extending it.
+_term_log_lock = threading.Lock()
+
+
+class LinearExpr(Operation, _MathEnabled):
+    """A linear expression in canonical form.
+
+    A :class:`LinearExpr` is a flat representation of
+    ``c1 * x1 + c2 * x2 + ... + constant``, where the ``xi`` are
+    :class:`Variable` instances and the ``ci`` are numbers. It is
+    what you get from linear arithmetic inside a :func:`linear_form`
+    context, but it can also be created directly.
+
+    The :attr:`args` are ``(constant, x1, c1, x2, c2, ...)``.
+
+    Args:
+        terms (dict, optional): Coefficients, keyed by :class:`Variable`.
+        constant (number, optional): The constant term. Default is 0.
+
+    Examples:
+
+        >>> x, y = Variable('x'), Variable('y')
+        >>> expr = LinearExpr({x: 2, y: -1}, 3)
+        >>> print(expr)
+        2 * x - y + 3
+        >>> expr.terms == {x: 2, y: -1}
+        True
+        >>> x.value, y.value = 5, 4
+        >>> expr.value
+        9
+
+        The order of terms does not matter for equality:
+
+        >>> LinearExpr({x: 2, y: -1}) == LinearExpr({y: -1, x: 2})
+        True
+
+    """
+    # The terms are the first _size pairs of _log. The merged terms and the
+    # args are made from them when first needed.
+    __slots__ = ('_log', '_size', '_constant', '_merged', '_linear_args')
+    _priority = 1
+
+    def __new__(cls, terms=None, constant=0):
+        terms = {} if terms is None else dict(terms)
+        if not _interning.get():
+            return cls._from_log(_TermLog(terms), len(terms), constant)
+        obj = super().__new__(cls, constant, *chain.from_iterable(terms.items()))
+        if not hasattr(obj, '_log'): # Not an interned object
+            obj._log = _TermLog(terms)
+            obj._size = len(terms)
+            obj._constant = constant
+            obj._merged = terms
+        return obj
+
+    @classmethod
+    def _from_log(cls, log, size, constant):
+        obj = object.__new__(cls)
+        obj._log = log
+        obj._size = size
+        obj._constant = constant
+        obj._merged = None
+        obj._linear_args = None
+        obj._hash = None
+        obj._leaves = None
+        obj._variables = None
+        return obj
+
+    def _extend(self, pairs, constant):
+        # A LinearExpr with pairs added to the terms of self and constant
+        # as constant, sharing the log of self. Returns None if self does not
+        # use the whole log, or if the result would not be in canonical form.
+        if _interning.get():
+            return None
+        with _term_log_lock:
+            log = self._log
+            if self._size != len(log.pairs):
+                return None
+            totals = log.totals
+            changes = {}
+            for var, coef in pairs:
+                total = changes[var] if var in changes else totals.get(var, 0)
+                changes[var] = total + coef
+            if 0 in changes.values():
+                return None
+            if len(totals) + sum(1 for var in changes if var not in totals) < 2:
+                return None
+            log.pairs.extend(pairs)
+            totals.update(changes)
+            return self._from_log(log, len(log.pairs), constant)
+
+    @property
+    def _terms(self):
+        # The coefficients, keyed by variable.
+        merged = self._merged
+        if merged is None:
+            log = self._log
+            with _term_log_lock:
+                if self._size == len(log.pairs):
+                    merged = dict(log.totals)
+                else:
+                    merged = {}
+                    for var, coef in log.pairs[:self._size]:
+                        merged[var] = merged.get(var, 0) + coef
+            self._merged = merged
+        return merged
+
+    @property
+    def _args(self):
+        args = self._linear_args
+        if args is None:
+            args = self._linear_args = (self._constant,) + tuple(chain.from_iterable(self._terms.items()))
+        return args
+
+    @_args.setter
+    def _args(self, args):
+        self._linear_args = args
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(self._key)
+        return self._hash
+
+    def __getstate__(self):
+        return dict(_terms=self._terms, _constant=self._constant)
+
+    def __setstate__(self, state):
+        terms = state['_terms']
+        self._log = _TermLog(terms)
+        self._size = len(terms)
+        self._constant = state['_constant']
+        self._merged = None
+        self._linear_args = None
+        self._hash = None
+        self._leaves = None
+        self._variables = None
+
+    @property
+    def _key(self):
+        # Equality should not depend on the order of the terms.
+        args = self._args
+        return (type(self), args[0], frozenset(zip(args[1::2], args[2::2])))
+
+    @classmethod
+    def _canonical(cls, terms, constant):
+        # Like the constructor, but drops zero terms and avoids wrapping
+        # a plain number or a single variable.
+        terms = {v: c for v, c in terms.items() if c != 0}
+        if not terms:
+            return constant
+        if constant == 0 and len(terms) == 1:
+            (v, c), = terms.items()
+            if c == 1:
+                return v
+        return cls(terms, constant)
+
+    @classmethod
+    def create(cls, constant, *args):
+        """Classmethod to create a new expression from :attr:`args`.
+
+        Variables are collected into a :class:`LinearExpr` and numbers
+        are added to the constant. If some argument is neither, for example
+        because a variable was replaced by an expression in :meth:`evaluate`,
+        the result is a :class:`Sum`.
+
+        Examples:
+
+            >>> x, y = Variable('x'), Variable('y')
+            >>> expr = LinearExpr({x: 2, y: 3}, 1)
+            >>> print(expr.evaluate(replace={y: 10}))
+            2 * x + 31
+        """
+        terms = {}
+        other = []
+        for var, coef in zip(args[0::2], args[1::2]):
+            if isinstance(var, Variable):
+                terms[var] = terms.get(var, 0) + coef
+            elif isinstance(var, numbers.Number):
+                constant += var * coef
+            else:
+                other.append(var * coef)
+        linear = cls._canonical(terms, constant)
+        if other:
+            return Sum([linear] + other)
+        return linear
+
+    @property
+    def terms(self):
+        """The coefficients as a ``dict``, keyed by :class:`Variable`."""
+        return dict(self._terms)
+
+    @property
+    def constant(self):
+        """The constant term."""
+        return self._constant
+
+    def __str__(self):
+        parts = []
+        for var, coef in self._terms.items():
+            sign = '-' if coef < 0 else '+'
+            coef = abs(coef)
+            text = str(var) if coef == 1 else '{} * {}'.format(coef, var)
+            parts.append((sign, text))
+        if self._constant != 0 or not parts:
+            sign = '-' if self._constant < 0 else '+'
+            parts.append((sign, str(abs(self._constant))))
+        first_sign, first_text = parts[0]
+        text = first_text if first_sign == '+' else '-' + first_text
+        return text + ''.join(' {} {}'.format(sign, t) for sign, t in parts[1:])
+
+
+def _linear_combination(*pairs):
+    """Make a linear combination of ``(expression, coefficient)`` pairs.
+
+    Returns a number, a :class:`Variable` or a :class:`LinearExpr`.
+
+    Raises:
+        TypeError: If some expression is not linear.
+    """
+    if pairs and type(pairs[0][0]) is LinearExpr and pairs[0][1] == 1:
+        first = pairs[0][0]
+        # Like expr + term or expr - term. Try to add the terms to the log
+        # of expr, instead of copying all its terms.
+        added = []
+        constant = first._constant
+        for expr, coef in pairs[1:]:
+            if isinstance(expr, Variable):
+                added.append((expr, coef))
+            elif isinstance(expr, LinearExpr):
+                added.extend((var, c * coef) for var, c in expr._terms.items())
+                constant += expr._constant * coef
+            elif isinstance(expr, numbers.Number):
+                constant += expr * coef
+            else:
+                raise TypeError('{} is not linear'.format(expr))
+        extended = first._extend(added, constant)
+        if extended is not None:
+            return extended
+
+    terms = {}
+    constant = 0
+    for expr, coef in pairs:
+        if isinstance(expr, Variable):
+            terms[expr] = terms.get(expr, 0) + coef
+        elif isinstance(expr, LinearExpr):
+            for var, c in expr._terms.items():
+                terms[var] = terms.get(var, 0) + c * coef
+            constant += expr._constant * coef
+        elif isinstance(expr, numbers.Number):
+            constant += expr * coef
+        else:
+            raise TypeError('{} is not linear'.format(expr))
+    return LinearExpr._canonical(terms, constant)
+
+
+def _evaluate_linear(constant, *args):
+    return constant + sum(var * coef for var, coef in zip(args[0::2], args[1::2]))
+
+
+def _constant_value(expr):
+    # The value of expr if it is constant, otherwise None.
+    if isinstance(expr, numbers.Number):
+        return expr
+    if isinstance(expr, (Variable, Operation)):
+        if all(hasattr(v, 'value') for v in expr.variables):
+            return expr.value
+    return None
+
+
+def _linear_terms(expr):
+    """Get the coefficients and constant of a linear expression.
+
+    Works for expression trees of any shape and depth, not only
+    :class:`LinearExpr`. Variables with values are treated as constants.
+
+    Returns:
+        ``(terms, constant)``, where ``terms`` is a ``dict`` of coefficients
+        keyed by :class:`Variable`, in order of first appearance.
+
+    Raises:
+        TypeError: If the expression is not linear.
+    """
+    terms = {}
+    constant = 0
+    stack = [(expr, 1)]
+    while stack:
+        expr, coef = stack.pop()
+        if isinstance(expr, Variable):
+            try:
+                constant += coef * expr._value
+            except AttributeError:
+                terms[expr] = terms.get(expr, 0) + coef
+        elif isinstance(expr, numbers.Number):
+            constant += coef * expr
+        elif isinstance(expr, LinearExpr):
+            args = expr._args
+            constant += coef * args[0]
+            stack.extend(reversed([(v, coef * c) for v, c in zip(args[1::2], args[2::2])]))
+        elif isinstance(expr, (Add, Sum)):
+            stack.extend((arg, coef) for arg in reversed(expr._args))
+        elif isinstance(expr, Sub):
+            a, b = expr._args
+            stack.extend(((b, -coef), (a, coef)))
+        elif isinstance(expr, Mul):
+            a, b = expr._args
+            a_value = _constant_value(a)
+            if a_value is not None:
+                stack.append((b, coef * a_value))
+                continue
+            b_value = _constant_value(b)
+            if b_value is None:
+                raise TypeError('{} is not linear'.format(expr))
+            stack.append((a, coef * b_value))
+        else:
+            raise TypeError('{} is not linear'.format(expr))
+    return terms, constant
+
+
 class Relation(Operation):
     """Base class for binary relations.
 
@@ -534,6 +1238,7 @@ class Relation(Operation):
 
     """
 
+    __slots__ = ()
     _priority = 0
 
     def __bool__(self):
@@ -570,6 +1275,7 @@ class Less(Relation):
             >>> (x > 1) == (1 < x)
             True
     '''
+    __slots__ = ()
     _format = '{} < {}'
 
 class LessEqual(Relation):
@@ -599,6 +1305,7 @@ class LessEqual(Relation):
             >>> (x >= 1) == (1 <= x)
             True
     '''
+    __slots__ = ()
     _format = '{} <= {}'
 
 
@@ -635,7 +1342,7 @@ class Eq(Relation):
         False
 
     '''
-
+    __slots__ = ()
     _format = '{} == {}'
 
 
@@ -661,7 +1368,7 @@ class Variable(_MathEnabled):
 
             >>> a = Variable('a')
             >>> a.lb = 10
-            >>> a.Domain = Domain.integer
+            >>> a.domain = Domain.integer
 
         is equivalent to
 
@@ -682,6 +1389,8 @@ class Variable(_MathEnabled):
 
     """
 
+    __slots__ = ('name', 'lb', 'ub', 'domain', '_value')
+
     _counter = 0
 
     def _next_counter(self):
@@ -810,6 +1519,86 @@ class Variable(_MathEnabled):
         del self._value
 
 
+class _DenseVariable(Variable):
+    """A :class:`Variable` whose bounds and value are stored in a dense
+    :class:`VariableCollection`."""
+
+    __slots__ = ('_collection', '_id')
+
+    def __init__(self, collection, id, domain=Domain.real):
+        # Variable.__init__() is not called, because name, lb and ub
+        # are kept by the collection.
+        self._collection = collection
+        self._id = id
+        self.domain = domain
+
+    def __getstate__(self):
+        state = dict(_collection=self._collection, _id=self._id, domain=self.domain)
+        with ignored(AttributeError):
+            state['name'] = Variable.name.__get__(self)
+        return state
+
+    def __setstate__(self, state):
+        if 'name' in state:
+            Variable.name.__set__(self, state.pop('name'))
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    @property
+    def name(self):
+        try:
+            return Variable.name.__get__(self)
+        except AttributeError:
+            collection = self._collection
+            return '{}({})'.format(collection.name, collection._indices[self._id])
+
+    @name.setter
+    def name(self, value):
+        Variable.name.__set__(self, value)
+
+    @property
+    def lb(self):
+        lb = self._collection._lb[self._id]
+        return None if lb == -numpy.inf else float(lb)
+
+    @lb.setter
+    def lb(self, value):
+        self._collection._lb[self._id] = -numpy.inf if value is None else value
+
+    @property
+    def ub(self):
+        ub = self._collection._ub[self._id]
+        return None if ub == numpy.inf else float(ub)
+
+    @ub.setter
+    def ub(self, value):
+        self._collection._ub[self._id] = numpy.inf if value is None else value
+
+    @property
+    def _value(self):
+        value = self._collection._values[self._id]
+        if numpy.isnan(value):
+            raise AttributeError('_value')
+        return float(value)
+
+    @_value.setter
+    def _value(self, value):
+        self._collection._values[self._id] = value
+
+    @_value.deleter
+    def _value(self):
+        if numpy.isnan(self._collection._values[self._id]):
+            raise AttributeError('_value')
+        self._collection._values[self._id] = numpy.nan
+
+
+_variable_creation_lock = threading.Lock()
+
+def _require_numpy():
+    if numpy is None:
+        raise RuntimeError('numpy is needed for this function').with_traceback(sys.exc_info()[2])
+
+
 class VariableCollection(object):
     """A lazy collection of :class:`Variable` instances.
 
@@ -818,6 +1607,11 @@ class VariableCollection(object):
 
     Args:
         name (str, optional): Name of the variable family.
+        dense (boolean, optional): If ``True``, the collection keeps the
+            bounds and values of its variables in NumPy arrays, indexed by
+            a compact integer id per variable, in order of creation. This
+            makes bulk operations like :meth:`values` and :meth:`take_values`
+            fast. Requires NumPy. Default is ``False``.
         **kwargs (optional): Passed on as keyword arguments to
             :class:`Variable` constructor.
 
@@ -835,14 +1629,33 @@ class VariableCollection(object):
         >>> x(1).domain
         <Domain.integer: 1>
 
+        A dense collection works the same way, but values can also be
+        read and written in bulk:
+
+        >>> z = VariableCollection('z', lb=0, dense=True)
+        >>> z(1).lb
+        0.0
+        >>> z.take_values({z(i): i * 10 for i in range(4)})
+        >>> z.values()
+        array([10.,  0., 20., 30.])
+        >>> z(2).value
+        20.0
+
     """
 
-    def __init__(self, name=None, **kwargs):
+    def __init__(self, name=None, dense=False, **kwargs):
         super().__init__()
         self.name = 'X{}'.format(self._next_counter()) if name is None else name
         self.name = _prefix_namespace(self.name)
         self._kwargs = kwargs
         self._vars = {}
+        self._dense = dense
+        if dense:
+            _require_numpy()
+            self._indices = []
+            self._lb = numpy.empty(0)
+            self._ub = numpy.empty(0)
+            self._values = numpy.empty(0)
 
     _counter = 0
 
@@ -874,14 +1687,139 @@ class VariableCollection(object):
             >>> x(1)
             <friendlysam.opt.Variable at 0x...: x(1)>
         """
-        if not index in self._vars:
-            name = '{}({})'.format(self.name, index)
-            with namespace(''):
-                variable = Variable(name=name, **self._kwargs)
-            self._vars[index] = variable
-        return self._vars[index]
+        try:
+            return self._vars[index]
+        except KeyError:
+            pass
+
+        # Constraint functions may be called from several threads, see
+        # ConstraintCollection.make_many(), so only one variable may be
+        # created at a time.
+        with _variable_creation_lock:
+            if not index in self._vars:
+                if self._dense:
+                    variable = self._make_dense_variable(index)
+                else:
+                    name = '{}({})'.format(self.name, index)
+                    variable = Variable(name=name, **self._kwargs)
+                    variable.name = name # Without namespace prefix
+                self._vars[index] = variable
+            return self._vars[index]
+
+    def _make_dense_variable(self, index):
+        id = len(self._indices)
+        if id == len(self._values):
+            self._grow()
+        self._indices.append(index)
+        lb, ub = self._kwargs.get('lb'), self._kwargs.get('ub')
+        self._lb[id] = -numpy.inf if lb is None else lb
+        self._ub[id] = numpy.inf if ub is None else ub
+        self._values[id] = numpy.nan
+        return _DenseVariable(self, id, domain=self._kwargs.get('domain', Domain.real))
+
+    def _grow(self):
+        size = max(16, 2 * len(self._values))
+        for attr in ('_lb', '_ub', '_values'):
+            old = getattr(self, attr)
+            new = numpy.empty(size)
+            new[:len(old)] = old
+            setattr(self, attr, new)
+
+    @property
+    def dense(self):
+        """``True`` if this is a dense collection. Read only."""
+        return self._dense
+
+    @property
+    def indices(self):
+        """The indices used so far, as a tuple, in order of creation."""
+        return tuple(self._vars.keys())
+
+    @property
+    def variables(self):
+        """The variables created so far, as a tuple, in order of creation.
+
+        In a dense collection, the position of a variable in this tuple is
+        its id, i.e. its position in the arrays of the collection.
+        """
+        return tuple(self._vars.values())
+
+    def _ids(self, indices):
+        return numpy.fromiter((self(index)._id for index in indices), dtype=numpy.intp)
+
+    def values(self, indices=None):
+        """Get the values of the variables as a NumPy array.
+
+        Variables without value are represented by NaN. Requires NumPy.
+
+        Args:
+            indices (iterable, optional): The indices to get values for.
+                If not supplied, all variables in the collection, in order
+                of creation.
+
+        Returns:
+            numpy.ndarray: The values.
+        """
+        _require_numpy()
+        if self._dense:
+            if indices is None:
+                return self._values[:len(self._indices)].copy()
+            return self._values[self._ids(indices)]
+
+        variables = self._vars.values() if indices is None else map(self, indices)
+        return numpy.fromiter(
+            (getattr(v, '_value', numpy.nan) for v in variables), dtype=float)
+
+    def take_values(self, solution, indices=None):
+        """Set values of many variables from a dictionary.
+
+        Like calling :meth:`Variable.take_value` for each variable.
+        Same as :meth:`apply_solution` with ``ignore_missing=False``.
+
+        Args:
+            solution (dict): Values, keyed by :class:`Variable`.
+            indices (iterable, optional): The indices of the variables to set
+                values of. If not supplied, all variables in the collection.
+
+        Raises:
+            KeyError if some variable is not in ``solution``.
+        """
+        self.apply_solution(solution, indices)
+
+    def apply_solution(self, solution, indices=None, ignore_missing=False):
+        """Set values of many variables from a solution.
+
+        See :func:`~friendlysam.opt.apply_solution`. In a dense collection,
+        the values are written to the array in one go.
+
+        Args:
+            solution (dict or :class:`Solution`): Values, keyed by :class:`Variable`.
+            indices (iterable, optional): The indices of the variables to set
+                values of. If not supplied, all variables in the collection.
+            ignore_missing (boolean, optional): Skip the variables that are
+                not in the solution, instead of raising ``KeyError``.
+
+        Returns:
+            list: The variables that are not in the solution.
+
+        Raises:
+            KeyError: If some variables are not in the solution, and
+                ``ignore_missing`` is false.
+        """
+        variables = self._vars.values() if indices is None else map(self, indices)
+        if not self._dense:
+            return apply_solution(solution, variables, ignore_missing=ignore_missing)
+
+        found, values, missing = _lookup(solution, variables)
+        if missing and not ignore_missing:
+            raise _missing_error(missing)
+        ids = numpy.fromiter((v._id for v in found), dtype=numpy.intp)
+        self._values[ids] = values
+        return missing
 
     def _update_var_kwargs(self, key, value):
+        # Only used for variables created after this, also in a dense
+        # collection.
         self._kwargs[key] = value
 
 
@@ -898,11 +1836,12 @@ class VariableCollection(object):
 
     @ub.setter
     def ub(self, value):
-        """Sets the upper bound of the contained variables.
+        """Sets the upper bound of the variables created after this.
 
         Warning:
 
-            Overrides the value on all existing variables in the collection.
+            Does not change the variables already in the collection. Set
+            the upper bound of each of them instead.
         """
         self._update_var_kwargs('ub', value)
 
@@ -920,11 +1859,12 @@ class VariableCollection(object):
 
     @lb.setter
     def lb(self, value):
-        """Sets the lower bound of the contained variables.
+        """Sets the lower bound of the variables created after this.
 
         Warning:
 
-            Overrides the value on all existing variables in the collection.
+            Does not change the variables already in the collection. Set
+            the lower bound of each of them instead.
         """
         self._update_var_kwargs('lb', value)
 
@@ -942,11 +1882,12 @@ class VariableCollection(object):
 
     @domain.setter
     def domain(self, value):
-        """Sets the domain of the contained variables.
+        """Sets the domain of the variables created after this.
 
         Warning:
 
-            Overrides the value on all existing variables in the collection.
+            Does not change the variables already in the collection. Set
+            the domain of each of them instead.
         """
         self._update_var_kwargs('domain', value)
 
@@ -976,8 +1917,52 @@ class ConstraintError(Exception):
         super().__init__(*args, **kwargs)
 
 
+class _Deferred(object):
+    """A text which is formatted the first time it is needed.
+
+    Descriptions of constraints are seldom read, so the formatting is
+    deferred until they are. The same object can be shared by many
+    constraints, and formats the text only once.
+
+    Args:
+        func (callable): Called as ``func(*args)`` to get the text.
+        *args: Arguments for ``func``.
+
+    Examples:
+
+        >>> d = _Deferred('resource={}'.format, 'power')
+        >>> c = Constraint(Variable('x') <= 1, desc=d)
+        >>> c.desc
+        'resource=power'
+    """
+
+    __slots__ = ('_func', '_args', '_value')
+
+    def __init__(self, func, *args):
+        super().__init__()
+        self._func = func
+        self._args = args
+        self._value = None
+
+    def render(self):
+        if self._func is not None:
+            self._value = self._func(*self._args)
+            self._func = self._args = None
+        return self._value
+
+    def __reduce__(self):
+        return (_Deferred, (_identity, self.render()))
+
+
+def _identity(value):
+    return value
+
+
 class _ConstraintBase(object):
     """docstring for _ConstraintBase"""
+
+    __slots__ = ('_desc', '_origin')
+
     def __init__(self, desc=None, origin=None):
         super().__init__()
         self.desc = desc
@@ -986,7 +1971,10 @@ class _ConstraintBase(object):
     @property
     def desc(self):
         """A description of the constraint, for debugging."""
-        return self._desc
+        desc = self._desc
+        if type(desc) is _Deferred:
+            desc = self._desc = desc.render()
+        return desc
     @desc.setter
     def desc(self, value):
         self._desc = value
@@ -1034,6 +2022,9 @@ class Constraint(_ConstraintBase):
         x + 1 <= 2 * x
 
     """
+
+    __slots__ = ('expr',)
+
     def __init__(self, expr, desc=None, origin=None):
         super().__init__(desc=desc, origin=origin)
         self.expr = expr
@@ -1071,6 +2062,9 @@ class Constraint(_ConstraintBase):
 
 class _SOS(_ConstraintBase):
     """docstring for _SOS"""
+
+    __slots__ = ('_variables', '_level')
+
     def __init__(self, level, variables, **kwargs):
         super().__init__(**kwargs)
         if not (isinstance(variables, tuple) or isinstance(variables, list)):
@@ -1110,6 +2104,9 @@ class SOS1(_SOS):
             constraint comes from.
 
     """
+
+    __slots__ = ()
+
     def __init__(self, variables, **kwargs):
         super().__init__(1, variables, **kwargs)
 
@@ -1132,6 +2129,9 @@ class SOS2(_SOS):
             constraint comes from.
 
     """
+
+    __slots__ = ()
+
     def __init__(self, variables, **kwargs):
         super().__init__(2, variables, **kwargs)
 
@@ -1197,7 +2197,26 @@ def dot(a, b):
         >>> vars = [x(i) for i in range(n)]
         >>> dot(coefficients, vars)
         <friendlysam.opt.Sum at 0x...>
+
+        Inside a :func:`linear_form` context, the result is a :class:`LinearExpr`
+        if all the products are linear.
     """
+    if _linear_form.get():
+        products = list(zip(a, b))
+        pairs = []
+        for ai, bi in products:
+            if isinstance(ai, numbers.Number):
+                pairs.append((bi, ai))
+            elif isinstance(bi, numbers.Number):
+                pairs.append((ai, bi))
+            else:
+                break
+        else:
+            try:
+                return _linear_combination(*pairs)
+            except TypeError:
+                pass
+        return Sum(ai * bi for ai, bi in products)
     return Sum(ai * bi for ai, bi in zip(a, b))
 
 def piecewise_affine(points, name=None):
@@ -1300,6 +2319,284 @@ def piecewise_affine_constraints(variables, include_lb=True):
         })
 
 
+class Solution(Mapping):
+    """The solution of a problem.
+
+    Works like a read-only ``dict`` of values, keyed by :class:`Variable`.
+    The values are kept in one array, in the order of :attr:`variables`,
+    so they can be copied to NumPy in one go with :meth:`to_numpy`.
+    Solvers return instances of this class.
+
+    Args:
+        variables (sequence): The variables, in order.
+        values (sequence of float): The value of each variable.
+        duals (dict, optional): Dual values, keyed by :class:`Constraint`.
+        reduced_costs (sequence of float, optional): The reduced cost of
+            each variable.
+
+    Examples:
+
+        >>> x, y = Variable('x'), Variable('y')
+        >>> solution = Solution([x, y], [1, 2.5])
+        >>> solution[y]
+        2.5
+        >>> solution == {x: 1, y: 2.5}
+        True
+        >>> x.take_value(solution)
+        >>> x.value
+        1.0
+
+    """
+
+    def __init__(self, variables, values, duals=None, reduced_costs=None):
+        super().__init__()
+        self._variables = tuple(variables)
+        self._values = array('d', values)
+        if len(self._values) != len(self._variables):
+            raise ValueError('there must be one value per variable')
+        self._positions = None
+        self._reduced_costs = None if reduced_costs is None else array('d', reduced_costs)
+
+        self.duals = {} if duals is None else duals
+        """Dual values, keyed by :class:`Constraint`. Empty if the solver
+        does not give any."""
+
+    def _index(self):
+        if self._positions is None:
+            self._positions = dict(zip(self._variables, range(len(self._variables))))
+        return self._positions
+
+    @property
+    def variables(self):
+        """The variables, as a tuple, in the order of the values."""
+        return self._variables
+
+    @property
+    def reduced_costs(self):
+        """The reduced costs, as a :class:`Solution`, or ``None`` if the
+        solver does not give any."""
+        if self._reduced_costs is None:
+            return None
+        reduced_costs = Solution(self._variables, self._reduced_costs)
+        reduced_costs._positions = self._index()
+        return reduced_costs
+
+    def __getitem__(self, variable):
+        return self._values[self._index()[variable]]
+
+    def __contains__(self, variable):
+        return variable in self._index()
+
+    def __iter__(self):
+        return iter(self._variables)
+
+    def __len__(self):
+        return len(self._variables)
+
+    def to_numpy(self, variables=None):
+        """Get the values as a NumPy array. Requires NumPy.
+
+        Args:
+            variables (iterable or :class:`VariableCollection`, optional):
+                The variables to get the values of. If a
+                :class:`VariableCollection`, all its variables, in the order
+                of its :attr:`~VariableCollection.indices`. If not supplied,
+                all the values, in the order of :attr:`variables`.
+
+        Returns:
+            numpy.ndarray: The values.
+
+        Raises:
+            KeyError: If some variable is not in the solution.
+
+        Examples:
+
+            >>> x = VariableCollection('x')
+            >>> solution = Solution([x(1), Variable('y'), x(0)], [1, 2, 3])
+            >>> solution.to_numpy()
+            array([1., 2., 3.])
+            >>> solution.to_numpy(x)
+            array([1., 3.])
+        """
+        _require_numpy()
+        values = numpy.frombuffer(self._values, dtype=float)
+        if variables is None:
+            return values.copy()
+        if isinstance(variables, VariableCollection):
+            variables = variables.variables
+        index = self._index()
+        positions = numpy.fromiter((index[v] for v in variables), dtype=numpy.intp)
+        return values[positions]
+
+    def __repr__(self):
+        return _short_default_repr(self, desc='{} variables'.format(len(self)))
+
+
+def _lookup(solution, variables):
+    # Look up variables in a solution. Returns (found, values, missing),
+    # where found and missing are lists of variables.
+    found, values, missing = [], [], []
+    if isinstance(solution, Solution):
+        index = solution._index()
+        source = solution._values
+        for v in variables:
+            position = index.get(v)
+            if position is None:
+                missing.append(v)
+            else:
+                found.append(v)
+                values.append(source[position])
+    else:
+        for v in variables:
+            try:
+                value = solution[v]
+            except KeyError:
+                missing.append(v)
+            else:
+                found.append(v)
+                values.append(value)
+    return found, values, missing
+
+
+def _missing_error(missing):
+    shown = ', '.join(repr(v) for v in missing[:3])
+    if len(missing) > 3:
+        shown += ', ...'
+    return KeyError('{} variables are not in the solution: {}'.format(len(missing), shown))
+
+
+def apply_solution(solution, variables, ignore_missing=False):
+    """Set the values of many variables from a solution.
+
+    Like calling :meth:`Variable.take_value` for each variable, but
+    variables missing from the solution are reported all at once. If any
+    variable is missing, no values are set, unless ``ignore_missing`` is
+    true.
+
+    See also :meth:`Problem.apply_solution`,
+    :meth:`VariableCollection.apply_solution` and
+    :meth:`~friendlysam.parts.Part.apply_solution`.
+
+    Args:
+        solution (dict or :class:`Solution`): Values, keyed by :class:`Variable`.
+        variables (iterable): The variables to set values of.
+        ignore_missing (boolean, optional): Set the values of the variables
+            that are in the solution, and skip the others.
+
+    Returns:
+        list: The variables that are not in the solution.
+
+    Raises:
+        KeyError: If some variables are not in the solution, and
+            ``ignore_missing`` is false. The message says how many.
+
+    Examples:
+
+        >>> x, y = Variable('x'), Variable('y')
+        >>> apply_solution({x: 1}, [x, y], ignore_missing=True) == [y]
+        True
+        >>> x.value
+        1
+    """
+    found, values, missing = _lookup(solution, variables)
+    if missing and not ignore_missing:
+        raise _missing_error(missing)
+    for v, value in zip(found, values):
+        v._value = value
+    return missing
+
+
+def _count_variables(counts, variables, n):
+    # Add n to the count of each variable, and drop the ones that reach 0.
+    for v in variables:
+        count = counts.get(v, 0) + n
+        if count:
+            counts[v] = count
+        else:
+            del counts[v]
+
+
+class _ConstraintSet(MutableSet):
+    """The constraints of a :class:`Problem`.
+
+    A set which keeps count of how many of its constraints each variable
+    is in, in the dict it is given. It has the methods of ``set``. Those
+    that make new sets, like :meth:`copy` and :meth:`union`, return plain
+    ``set`` objects.
+    """
+
+    def __init__(self, counts):
+        super().__init__()
+        self._constraints = set()
+        self._counts = counts
+
+    def __contains__(self, constraint):
+        return constraint in self._constraints
+
+    def __iter__(self):
+        return iter(self._constraints)
+
+    def __len__(self):
+        return len(self._constraints)
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, self._constraints)
+
+    def add(self, constraint):
+        if constraint not in self._constraints:
+            self._constraints.add(constraint)
+            _count_variables(self._counts, constraint.variables, 1)
+
+    def discard(self, constraint):
+        if constraint in self._constraints:
+            self._constraints.remove(constraint)
+            _count_variables(self._counts, constraint.variables, -1)
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        # Results of operators like | and & are plain sets.
+        return set(iterable)
+
+    def update(self, *others):
+        for other in others:
+            for constraint in other:
+                self.add(constraint)
+
+    def difference_update(self, *others):
+        for other in others:
+            for constraint in other:
+                self.discard(constraint)
+
+    def intersection_update(self, *others):
+        keep = self._constraints.intersection(*others)
+        for constraint in [c for c in self._constraints if c not in keep]:
+            self.discard(constraint)
+
+    def symmetric_difference_update(self, other):
+        self ^= other
+
+    def copy(self):
+        return set(self._constraints)
+
+    def union(self, *others):
+        return self._constraints.union(*others)
+
+    def intersection(self, *others):
+        return self._constraints.intersection(*others)
+
+    def difference(self, *others):
+        return self._constraints.difference(*others)
+
+    def symmetric_difference(self, other):
+        return self._constraints.symmetric_difference(other)
+
+    def issubset(self, other):
+        return self._constraints.issubset(other)
+
+    def issuperset(self, other):
+        return self._constraints.issuperset(other)
+
+
 class Problem(object):
     """An optimization problem.
 
@@ -1318,7 +2615,7 @@ class Problem(object):
         >>> solver = fs.get_solver()
         >>> solution = solver.solve(prob)
         >>> type(solution)
-        <class 'dict'>
+        <class 'friendlysam.opt.Solution'>
         >>> solution[x(1)]
         1.0
         >>> solution[x(2)]
@@ -1327,7 +2624,9 @@ class Problem(object):
     """
     def __init__(self):
         super().__init__()
-        self._constraints = set()
+        # The number of constraints and objectives each variable is in.
+        self._variable_counts = {}
+        self._constraints = _ConstraintSet(self._variable_counts)
 
     @property
     def objective(self):
@@ -1339,6 +2638,10 @@ class Problem(object):
         The objective function of the optimization problem
         represented by a :class:`Maximize` or :class:`Minimize` instance.
         """
+        _count_variables(self._variable_counts, value.variables, 1)
+        old = getattr(self, '_objective', None)
+        if old is not None:
+            _count_variables(self._variable_counts, old.variables, -1)
         self._objective = value
     
     def _add_constraint(self, constraint):
@@ -1388,20 +2691,104 @@ class Problem(object):
         self.add(*addition)
         return self
 
+    def remove(self, *constraints):
+        """Remove one or more constraints from the problem.
+
+        Args:
+            *constraints: Constraints or iterables of constraints, like in
+                :meth:`add`. Relations must be given as the
+                :class:`Constraint` instances they were wrapped in.
+
+        Raises:
+            KeyError: If some constraint is not in the problem. The
+                constraints before it are removed.
+
+        Examples:
+
+            >>> prob = Problem()
+            >>> x = Variable('x')
+            >>> c = Constraint(x <= 1)
+            >>> prob.add(c, x >= 0)
+            >>> prob.remove(c)
+            >>> len(prob.constraints)
+            1
+
+        """
+        for constraint in constraints:
+            try:
+                for constraint in constraint:
+                    self._constraints.remove(constraint)
+            except TypeError:
+                self._constraints.remove(constraint)
+
+    @property
+    def variables(self):
+        """All :class:`Variable` instances in the objective and constraints,
+        with or without value.
+
+        A set-like view, which is kept up to date as constraints are added
+        and removed, and when the objective is set.
+
+        Examples:
+
+            >>> prob = Problem()
+            >>> x = VariableCollection('x')
+            >>> prob.objective = Minimize(x(1))
+            >>> prob += x(1) + x(2) >= 1
+            >>> prob.variables == {x(1), x(2)}
+            True
+
+        """
+        return self._variable_counts.keys()
+
     def variables_without_value(self):
         """Get all :class:`Variable` instances without value.
 
         These are effectively the variables of the optimization problem.
+        They are filtered from :attr:`variables`, so the expressions are
+        not walked.
+        """
+        return set(v for v in self._variable_counts if not hasattr(v, 'value'))
+
+    def apply_solution(self, solution, ignore_missing=False):
+        """Set the values of the variables of the problem from a solution.
+
+        The variables are those of :meth:`variables_without_value`. See
+        :func:`~friendlysam.opt.apply_solution`.
+
+        Args:
+            solution (dict or :class:`Solution`): Values, keyed by :class:`Variable`.
+            ignore_missing (boolean, optional): Skip the variables that are
+                not in the solution, instead of raising ``KeyError``.
+
+        Returns:
+            list: The variables that are not in the solution.
+        """
+        return apply_solution(solution, self.variables_without_value(), ignore_missing=ignore_missing)
+
+    def write_lp(self, path):
+        """Write the problem to a file in CPLEX LP format.
+
+        See :func:`friendlysam.solvers.writers.write_lp`.
+        """
+        from friendlysam.solvers.writers import write_lp
+        return write_lp(self, path)
+
+    def write_mps(self, path, objsense=False):
+        """Write the problem to a file in free MPS format.
+
+        See :func:`friendlysam.solvers.writers.write_mps`.
         """
-        sources = set(self.constraints) | {self.objective}
-        variables = set(chain(*(src.variables for src in sources)))
-        return set(v for v in variables if not hasattr(v, 'value'))
+        from friendlysam.solvers.writers import write_mps
+        return write_mps(self, path, objsense=objsense)
 
     @property
     def constraints(self):
         """A set of constraints.
 
-        To add constraints, use :meth:`Problem.add`.
+        To add constraints, use :meth:`Problem.add`, and to remove them,
+        :meth:`Problem.remove`. The set can also be changed directly,
+        with its methods like ``add()``, ``remove()`` and ``clear()``.
         """
         return self._constraints
 
@@ -1413,5 +2800,221 @@ CONCRETE_EVALUATORS = {
     Add: operator.add,
     Sub: operator.sub,
     Mul: operator.mul,
-    Sum: lambda *x: sum(x)
+    Sum: lambda *x: sum(x),
+    LinearExpr: _evaluate_linear
+}
+
+
+# Infix operators used by compiled expressions, by exact class.
+_COMPILED_OPERATORS = {
+    Eq: '==',
+    Less: '<',
+    LessEqual: '<=',
+    Add: '+',
+    Sub: '-',
+    Mul: '*',
 }
+
+# The number of kernels of compiled expressions to keep.
+_KERNEL_CACHE_SIZE = 1024
+
+# The number of terms of a sum on each line of a kernel. Python's compiler
+# recurses into long chains of +, so long sums are split over many lines.
+_KERNEL_CHUNK = 100
+
+
+def _linearize(expr):
+    # Flatten an expression tree, without recursion. Returns (shape, leaves)
+    # where leaves are the arguments that are not operations, in order, and
+    # shape is a tuple with one (class, args) item for each distinct
+    # operation, in post-order. The args refer to earlier items as
+    # ('t', position) and to leaves as ('x', position). Expressions which
+    # differ only in their leaves have the same shape.
+    shape = []
+    leaves = []
+    positions = {}
+    stack = [expr]
+    while stack:
+        node = stack[-1]
+        if id(node) in positions:
+            stack.pop()
+            continue
+        pending = [arg for arg in node._args
+                   if isinstance(arg, Operation) and id(arg) not in positions]
+        if pending:
+            stack.extend(reversed(pending))
+            continue
+        stack.pop()
+        args = []
+        for arg in node._args:
+            if isinstance(arg, Operation):
+                args.append(('t', positions[id(arg)]))
+            else:
+                args.append(('x', len(leaves)))
+                leaves.append(arg)
+        positions[id(node)] = len(shape)
+        shape.append((node.__class__, tuple(args)))
+    return tuple(shape), leaves
+
+
+def _sum_lines(target, terms):
+    # Lines of code setting target to the sum of terms, a few at a time.
+    # Like sum(), they add the terms from the left.
+    if not terms:
+        return ['{} = 0'.format(target)]
+    chunks = [terms[i:i + _KERNEL_CHUNK] for i in range(0, len(terms), _KERNEL_CHUNK)]
+    lines = ['{} = {}'.format(target, ' + '.join(chunks[0]))]
+    for chunk in chunks[1:]:
+        lines.append('{} = {} + {}'.format(target, target, ' + '.join(chunk)))
+    return lines
+
+
+@lru_cache(maxsize=_KERNEL_CACHE_SIZE)
+def _kernel(shape):
+    # Get a function computing the value of expressions of a shape, from a
+    # sequence of leaf values. The leaf values may also be NumPy arrays.
+    # The most recently used kernels are kept.
+    namespace = {}
+    lines = ['def kernel(x):']
+    for k, (cls, args) in enumerate(shape):
+        target = 't{}'.format(k)
+        names = [('t{}' if kind == 't' else 'x[{}]').format(position) for kind, position in args]
+        if cls in _COMPILED_OPERATORS:
+            code = ['{} = {} {} {}'.format(target, names[0], _COMPILED_OPERATORS[cls], names[1])]
+        elif cls is Sum:
+            code = _sum_lines(target, names)
+        elif cls is LinearExpr:
+            terms = ['{} * {}'.format(v, c) for v, c in zip(names[1::2], names[2::2])]
+            code = _sum_lines(target, [names[0]] + terms)
+        else:
+            func_name = 'f{}'.format(k)
+            namespace[func_name] = CONCRETE_EVALUATORS.get(cls, cls.create)
+            code = ['{} = {}({})'.format(target, func_name, ', '.join(names))]
+        lines.extend('    ' + line for line in code)
+    lines.append('    return t{}'.format(len(shape) - 1))
+
+    exec(compile('\n'.join(lines), '<compiled expression>', 'exec'), namespace)
+    return namespace['kernel']
+
+
+def _leaf_value(leaf, values=None):
+    # The concrete value of a leaf of an expression.
+    if isinstance(leaf, Variable):
+        if values is not None:
+            try:
+                return values[leaf]
+            except KeyError:
+                pass
+        try:
+            return leaf.value
+        except AttributeError:
+            msg = 'cannot get a numeric value: {} has no value'.format(leaf)
+            raise NoValueError(msg).with_traceback(sys.exc_info()[2])
+    return leaf
+
+
+class CompiledExpression(object):
+    """An expression compiled to straight-line Python code.
+
+    Create instances with :func:`compile_expression`.
+
+    The expression tree is flattened once, and each distinct
+    subexpression becomes one line of code. Reading :attr:`value` then
+    only looks up the values of the variables and runs the code, without
+    walking the tree. The code is shared by all expressions with the same
+    shape, i.e. the same operations but possibly other variables and
+    constants.
+    """
+
+    def __init__(self, expr):
+        super().__init__()
+        self.expr = expr
+        """The expression that was compiled."""
+        shape, self._leaves = _linearize(expr)
+        self._kernel = _kernel(shape)
+
+    @property
+    def variables(self):
+        """The variables of the expression, as a ``frozenset``."""
+        return self.expr.variables
+
+    @property
+    def value(self):
+        """The value of the expression, from the current values of the variables.
+
+        Gives the same result as :attr:`Operation.value`.
+
+        Raises:
+            :exc:`NoValueError` if some variable has no value.
+        """
+        return self._kernel([_leaf_value(leaf) for leaf in self._leaves])
+
+    def evaluate(self, values):
+        """The value of the expression, with values of some variables given.
+
+        Args:
+            values (dict or :class:`Solution`): Values keyed by
+                :class:`Variable`. Variables not in ``values`` get
+                their :attr:`Variable.value`.
+
+        Raises:
+            :exc:`NoValueError` if some variable has no value.
+        """
+        return self._kernel([_leaf_value(leaf, values) for leaf in self._leaves])
+
+    def __repr__(self):
+        return _short_default_repr(self, desc=str(self.expr))
+
+
+def compile_expression(expr):
+    """Compile an expression for fast, repeated evaluation.
+
+    Args:
+        expr (:class:`Operation`): The expression to compile.
+
+    Returns:
+        :class:`CompiledExpression`
+
+    Examples:
+
+        >>> x = VariableCollection('x')
+        >>> compiled = compile_expression(x(1) * 2 + x(2))
+        >>> x(1).value, x(2).value = 3, 4
+        >>> compiled.value
+        10
+        >>> x(1).value = 5
+        >>> compiled.value
+        14
+        >>> compiled.evaluate({x(2): 0})
+        10
+    """
+    return CompiledExpression(expr)
+
+
+def _evaluate_many(exprs):
+    # Values of many expressions, as a list of floats. Expressions with the
+    # same shape are evaluated together, by one call to their kernel with
+    # NumPy arrays of leaf values.
+    values = [None] * len(exprs)
+    groups = {}
+    for i, expr in enumerate(exprs):
+        if isinstance(expr, Operation):
+            shape, leaves = _linearize(expr)
+            group = groups.setdefault(shape, ([], []))
+            group[0].append(i)
+            group[1].append([_leaf_value(leaf) for leaf in leaves])
+        else:
+            values[i] = float(expr)
+
+    for shape, (positions, leaf_values) in groups.items():
+        kernel = _kernel(shape)
+        try:
+            columns = numpy.array(leaf_values, dtype=float).T
+        except (TypeError, ValueError):
+            # Some leaves are not numbers, so evaluate one by one.
+            results = [kernel(row) for row in leaf_values]
+        else:
+            results = numpy.broadcast_to(kernel(columns), (len(positions),)).tolist()
+        for i, value in zip(positions, results):
+            values[i] = float(value)
+    return values
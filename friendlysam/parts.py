@@ -4,17 +4,68 @@ import sys
 import logging
 logger = logging.getLogger(__name__)
 
-from collections import defaultdict, namedtuple
-from itertools import chain
+from collections import defaultdict, namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextvars import copy_context
+from itertools import chain, count
 
 import networkx as nx
 
 import friendlysam as fs
-from friendlysam.opt import Constraint, VariableCollection, namespace
+from friendlysam.opt import Constraint, VariableCollection, namespace, _Deferred
 from friendlysam.compat import ignored
 
 
 
+def batched(func):
+    """Mark a constraint function as batched.
+
+    A batched constraint function takes a tuple of indices instead of a single
+    index, and returns the constraints for all of them at once. This saves a
+    Python call per index, and lets the function build all its constraints
+    in one go, for example with :func:`~friendlysam.opt.linear_form` or
+    with NumPy arrays of data.
+
+    :meth:`ConstraintCollection.make` calls a batched function with a
+    one-element tuple, and :meth:`ConstraintCollection.make_many` calls it
+    once with all the indices. The :attr:`~friendlysam.opt.Constraint.origin`
+    of the constraints has the tuple of indices as ``index``.
+
+    Args:
+        func (callable): A function taking a tuple of indices and returning
+            a constraint or an iterable of constraints.
+
+    Returns:
+        ``func``, marked as batched. It still works as before when called
+        directly.
+
+    Examples:
+
+        >>> from friendlysam.opt import VariableCollection
+        >>> x = VariableCollection('x')
+        >>> part = Part()
+        >>> @batched
+        ... def upper_bounds(indices):
+        ...     return [x(t) <= t for t in indices]
+        ...
+        >>> part.constraints += upper_bounds
+        >>> [str(c.expr) for c in part.constraints.make_many(range(3))]
+        ['x(0) <= 0', 'x(1) <= 1', 'x(2) <= 2']
+        >>> [c.origin.index for c in part.constraints.make(5)]
+        [(5,)]
+
+    """
+    try:
+        func._fs_batched = True
+    except AttributeError: # A bound method
+        func.__func__._fs_batched = True
+    return func
+
+
+def _is_batched(func):
+    return getattr(func, '_fs_batched', False)
+
+
 class ConstraintCollection(object):
     """
     Generates constraints from functions.
@@ -32,7 +83,7 @@ class ConstraintCollection(object):
     def __init__(self, owner):
         super().__init__()
         self._owner = owner
-        self._constraint_funcs = set()
+        self._constraint_funcs = OrderedDict()
 
     _origin_tuple = namedtuple('CallTo', ['func', 'index', 'owner'])
 
@@ -40,6 +91,8 @@ class ConstraintCollection(object):
     def make(self, index):
         """Create constraints from contained functions.
 
+        :func:`batched` constraint functions are called with ``(index,)``.
+
         Args:
             index: The index to call the constraint functions with.
 
@@ -51,31 +104,87 @@ class ConstraintCollection(object):
             c(index) # Returns a set with all the constraints from func1 and func2
 
         """
-        constraints = set()
+        return set(self._make_list(index, include_batched=True))
 
-        for func in self._constraint_funcs:
-            origin = self._origin_tuple(func=func, index=index, owner=self._owner)
-            func_output = func(index)
-            try:
-                func_output = iter(func_output)
-            except TypeError: # not iterable
-                func_output = (func_output,)
+    def make_many(self, indices, executor=None):
+        """Create constraints from contained functions, for many indices.
+
+        :func:`batched` constraint functions are called once, with a tuple
+        of all the indices.
+
+        Args:
+            indices (iterable): The indices to call the constraint functions with.
+            executor (``concurrent.futures.Executor``, optional): If given,
+                the constraint functions are called in the executor,
+                one task per index. See the note below.
+
+        Returns:
+            A list of the constraints, without duplicates. The constraints
+            are ordered by index, then by constraint function in the order
+            they were added, then in the order the function returned them.
+            The constraints from batched functions come last, in the
+            order the functions were added. The order is the same with
+            or without an executor.
 
-            for constraint in func_output:
-                if isinstance(constraint, fs.Relation):
-                    constraint = Constraint(constraint)
+        Note:
 
-                if constraint.origin is None:
-                    constraint.origin = origin
+            Variables are identified by the objects themselves, so the
+            constraint functions must be called in this process. A
+            ``ThreadPoolExecutor`` works, but a ``ProcessPoolExecutor``
+            raises ``ValueError``. Constraint functions are usually pure
+            Python code, so threads only speed things up if the
+            functions release the GIL, e.g. in NumPy calls.
 
-                constraints.add(constraint)
+        Examples:
+
+            c = ConstraintCollection(owner)
+            c += [func1, func2]
+            with ThreadPoolExecutor(4) as executor:
+                constraints = c.make_many(range(8760), executor=executor)
+
+        """
+        indices = tuple(indices)
+        lists = _map(self._make_list, indices, executor)
+        return _merge(chain(lists, [self._make_batched(indices)]))
+
+    def _make_list(self, index, include_batched=False):
+        constraints = []
+        for func, is_batched in self._constraint_funcs.items():
+            if not is_batched:
+                self._call(func, index, constraints)
+            elif include_batched:
+                self._call(func, (index,), constraints)
+        return constraints
 
+    def _make_batched(self, indices):
+        constraints = []
+        for func, is_batched in self._constraint_funcs.items():
+            if is_batched:
+                self._call(func, indices, constraints)
         return constraints
 
+    def _call(self, func, index, constraints):
+        # Call func(index) and append the output to constraints.
+        origin = self._origin_tuple(func, index, self._owner)
+        func_output = func(index)
+        try:
+            func_output = iter(func_output)
+        except TypeError: # not iterable
+            func_output = (func_output,)
+
+        for constraint in func_output:
+            if isinstance(constraint, fs.Relation):
+                constraint = Constraint(constraint)
+
+            if constraint.origin is None:
+                constraint.origin = origin
+
+            constraints.append(constraint)
+
     def _add_constraint_func(self, func):
         if not callable(func):
             raise ValueError('constraint funcs must be callable but {} is not'.format(func))
-        self._constraint_funcs.add(func)
+        self._constraint_funcs[func] = _is_batched(func)
 
     def add(self, addition):
         """Add a constraint function, or an iterable of constraint functions.
@@ -104,6 +213,32 @@ class ConstraintCollection(object):
         return self
 
 
+def _map(make_list, args, executor):
+    # Call make_list(arg) for each arg, possibly in executor.
+    if executor is None:
+        return map(make_list, args)
+    elif isinstance(executor, ProcessPoolExecutor):
+        raise ValueError(
+            'constraints cannot be made in another process, '
+            'because variables are identified by the objects themselves')
+    else:
+        # Run in a copy of the calling context, so that settings like
+        # linear_form() apply in the executor's threads too.
+        context = copy_context()
+        return executor.map(lambda arg: context.copy().run(make_list, arg), args)
+
+
+def _merge(lists):
+    # Merge lists of constraints in order, without duplicates.
+    seen = set()
+    constraints = []
+    for constraint in chain.from_iterable(lists):
+        if not constraint in seen:
+            seen.add(constraint)
+            constraints.append(constraint)
+    return constraints
+
+
 class Part(object):
     """A part of a model.
 
@@ -137,12 +272,17 @@ class Part(object):
     """
 
     _subclass_counters = defaultdict(int)
+    _creation_counter = count()
 
     def __new__(cls, *args, **kwargs):
         self = super().__new__(cls)
         self._subclass_counters[type(self)] += 1
+        self._creation_order = next(Part._creation_counter)
         self._constraints = ConstraintCollection(self)
         self._parts = set()
+        self._parents = set()
+        self._reset_parts_cache()
+        self._constraints_revision = 0
 
         self.name = '{}{:04d}'.format(type(self).__name__, self._subclass_counters[type(self)])
         return self
@@ -162,6 +302,8 @@ class Part(object):
     @name.setter
     def name(self, value):
         self._name = value
+        for part in self._ancestors_and_self():
+            part._name_index = None
 
     _time_unit = 1
     @property
@@ -440,6 +582,48 @@ class Part(object):
             raise AttributeError("Don't replace the constraint collection. "
                 "Use constraints.add() to add constraint functions.")
 
+    def make_constraints(self, indices, executor=None):
+        """Make the constraints of this part and all its descendants.
+
+        Calls :meth:`ConstraintCollection.make_many` on the
+        :attr:`constraints` of each part in :attr:`descendants_and_self`.
+
+        Args:
+            indices (iterable): The indices to make constraints for.
+            executor (``concurrent.futures.Executor``, optional): If given,
+                the constraint functions are called in the executor, one
+                task per part and index. See :meth:`ConstraintCollection.make_many`.
+
+        Returns:
+            A list of the constraints, without duplicates, ordered by index,
+            then by part in the order the parts were created. The constraints
+            from :func:`batched` functions come last, by part. The order is
+            the same with or without an executor.
+
+        Examples:
+
+            >>> from friendlysam.opt import VariableCollection
+            >>> parent, child = Part('parent'), Part('child')
+            >>> parent.add_part(child)
+            >>> x = VariableCollection('x')
+            >>> parent.constraints += lambda t: x(t) <= 1
+            >>> child.constraints += lambda t: x(t) >= 0
+            >>> for constraint in parent.make_constraints(range(2)):
+            ...     print(constraint.expr)
+            ...
+            x(0) <= 1
+            0 <= x(0)
+            x(1) <= 1
+            0 <= x(1)
+
+        """
+        parts = sorted(self.descendants_and_self, key=lambda part: part._creation_order)
+        indices = tuple(indices)
+        calls = [(part, index) for index in indices for part in parts]
+        lists = _map(lambda call: call[0].constraints._make_list(call[1]), calls, executor)
+        batched_lists = (part.constraints._make_batched(indices) for part in parts)
+        return _merge(chain(lists, batched_lists))
+
     def __repr__(self):
         if self.name:
             return '<{} at {}: {}>'.format(self.__class__.__name__, hex(id(self)), self)
@@ -454,7 +638,9 @@ class Part(object):
         """Try to find a part by name.
 
         Searches among :attr:`descendants_and_self`, comparing the :attr:`name`.
-        If there is exactly one match, it is returned.
+        If there is exactly one match, it is returned. The names are indexed
+        on the first call, and the index is kept until a part is added,
+        removed or renamed somewhere in the tree.
 
         Args:
             name: The name to search for.
@@ -465,7 +651,13 @@ class Part(object):
         Raises:
             ValueError: If there is no match or several matches.
         """
-        matches = [part for part in self.descendants_and_self if part.name == name]
+        if self._name_index is None:
+            index = defaultdict(list)
+            for part in self.descendants_and_self:
+                index[part.name].append(part)
+            self._name_index = dict(index)
+
+        matches = self._name_index.get(name, ())
         if len(matches) == 1:
             return matches[0]
         elif len(matches) == 0:
@@ -474,6 +666,31 @@ class Part(object):
             raise ValueError(
                 "'{}' has more than one part '{}'".format(repr(self), name))
 
+    def find_many(self, names):
+        """Find several parts by name.
+
+        Works like :meth:`find` for each name.
+
+        Args:
+            names (iterable): The names to search for.
+
+        Returns:
+            A list with a part for each name, in the same order.
+
+        Raises:
+            ValueError: If there is no match or several matches for some name.
+
+        Examples:
+
+            >>> parent = Part('parent')
+            >>> for name in ('a', 'b', 'c'):
+            ...     parent.add_part(Part(name))
+            ...
+            >>> [part.name for part in parent.find_many(['c', 'a'])]
+            ['c', 'a']
+        """
+        return [self.find(name) for name in names]
+
 
     def parts(self, depth='inf', include_self=True):
         """Get contained parts, recursively.
@@ -488,7 +705,9 @@ class Part(object):
             include_self (boolean, optional): Include this part in the results?
 
         Returns:
-            A set of parts.
+            A set of parts. With ``depth='inf'``, it is a ``frozenset``,
+            which is cached until a part is added or removed somewhere
+            in the tree.
 
         Examples:
 
@@ -507,26 +726,60 @@ class Part(object):
             True
 
         """
-        parts = set()
         depth = float(depth)
+        if depth == float('inf'):
+            return self.descendants_and_self if include_self else self.descendants
 
-        if depth >= 1:
-            parts.update(self._parts)
-
-        parts.update(*(subpart.parts(depth=depth - 1, include_self=False) for subpart in parts))
+        parts = set()
+        level = {self}
+        for i in range(int(depth)):
+            level = set(chain.from_iterable(part._parts for part in level)) - parts
+            if not level:
+                break
+            parts.update(level)
 
         if include_self:
             parts.add(self)
 
         return parts
 
+    def _reset_parts_cache(self):
+        self._children = None
+        self._descendants = None
+        self._descendants_and_self = None
+        self._name_index = None
+
+    def _constraints_changed(self):
+        # Something other than the constraint functions, which the
+        # constraints of this part depend on, has changed. Models that keep
+        # constraints, like MyopicDispatchModel, make them again.
+        self._constraints_revision += 1
+
+    def _invalidate_parts_cache(self):
+        # The cached descendants of this part and all its ancestors are
+        # no longer valid.
+        for part in self._ancestors_and_self():
+            part._reset_parts_cache()
+
+    def _ancestors_and_self(self):
+        found = {self}
+        stack = [self]
+        while stack:
+            for parent in stack.pop()._parents:
+                if not parent in found:
+                    found.add(parent)
+                    stack.append(parent)
+        return found
+
     @property    
     def children(self):
         """Parts in this part, excluding ``self``.
 
-        To add children, use :meth:`add_part`.
+        This is a cached ``frozenset``. To add children, use :meth:`add_part`.
         """
-        return self.parts(depth=1, include_self=False)
+        if self._children is None:
+            self._children = frozenset(self._parts)
+        return self._children
 
     @property
     def children_and_self(self):
@@ -538,13 +791,34 @@ class Part(object):
 
     @property
     def descendants(self):
-        """All :attr:`children`, children of children, etc, excluding ``self``."""
-        return self.parts(depth='inf', include_self=False)
+        """All :attr:`children`, children of children, etc, excluding ``self``.
+
+        This is a cached ``frozenset``.
+        """
+        if self._descendants is None:
+            descendants = set()
+            stack = list(self._parts)
+            while stack:
+                part = stack.pop()
+                if part in descendants:
+                    continue
+                descendants.add(part)
+                if part._descendants is None:
+                    stack.extend(part._parts)
+                else:
+                    descendants.update(part._descendants)
+            self._descendants = frozenset(descendants)
+        return self._descendants
 
     @property
     def descendants_and_self(self):
-        """All :attr:`children`, children of children, etc, including ``self``."""
-        return self.parts(depth='inf', include_self=True)
+        """All :attr:`children`, children of children, etc, including ``self``.
+
+        This is a cached ``frozenset``.
+        """
+        if self._descendants_and_self is None:
+            self._descendants_and_self = self.descendants | {self}
+        return self._descendants_and_self
 
 
     def add_part(self, part):
@@ -557,12 +831,15 @@ class Part(object):
             InsanityError: If the calling part is a descendant of the part to add.
                 (This would generate a cyclic relationship.)
         """
-        if self in part.descendants_and_self:
+        if part in self._ancestors_and_self():
             raise fs.InsanityError(
                 ('cannot add {} to {} because it would '
                 'generate a cyclic relationship').format(part, self))
 
         self._parts.add(part)
+        part._parents.add(self)
+        self._invalidate_parts_cache()
+        self._constraints_changed()
 
 
     def remove_part(self, part):
@@ -576,6 +853,9 @@ class Part(object):
         """
         with ignored(KeyError):
             self._parts.remove(part)
+            part._parents.discard(self)
+            self._invalidate_parts_cache()
+            self._constraints_changed()
 
 
     def state_variables(self, index):
@@ -608,6 +888,86 @@ class Part(object):
         msg = "{} has not defined state_variables".format(repr(self))
         raise AttributeError(msg).with_traceback(sys.exc_info()[2])
 
+    def apply_solution(self, solution, indices, ignore_missing=False):
+        """Set the values of state variables from a solution.
+
+        The variables are the :meth:`state_variables` of this part and all
+        its :attr:`descendants`, at each of the indices. See
+        :func:`~friendlysam.opt.apply_solution`.
+
+        Args:
+            solution (dict or :class:`~friendlysam.opt.Solution`): Values,
+                keyed by :class:`~friendlysam.opt.Variable`.
+            indices (iterable): The indices to set the state variables at.
+            ignore_missing (boolean, optional): Skip the variables that are
+                not in the solution, instead of raising ``KeyError``.
+
+        Returns:
+            list: The variables that are not in the solution.
+
+        Examples:
+
+            >>> part = Part()
+            >>> x = VariableCollection('x')
+            >>> part.state_variables = lambda t: (x(t),)
+            >>> part.apply_solution({x(0): 1, x(1): 2}, range(2))
+            []
+            >>> x(1).value
+            2
+        """
+        indices = tuple(indices)
+        variables = chain.from_iterable(
+            part.state_variables(index) for part in self.descendants_and_self for index in indices)
+        return fs.apply_solution(solution, variables, ignore_missing=ignore_missing)
+
+class _FuncDict(dict):
+    """A dict of balance functions, which tells its owner node when it changes."""
+
+    def __init__(self, owner):
+        super().__init__()
+        self._owner = owner
+
+    def _changed(self):
+        # When unpickling, the items are set before the owner.
+        owner = getattr(self, '_owner', None)
+        if owner is not None:
+            owner._balance_funcs_changed()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._changed()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._changed()
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self._changed()
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        self._changed()
+        return item
+
+    def setdefault(self, key, default=None):
+        value = super().setdefault(key, default)
+        self._changed()
+        return value
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._changed()
+
+
+_BALANCE_DESC = 'Balance constraint (resource={})'
+
+
 class Node(Part):
     """A node with balance constraints.
 
@@ -641,14 +1001,21 @@ class Node(Part):
 
     def __new__(cls, *args, **kwargs):
         self = super().__new__(cls, *args, **kwargs)
-        self._consumption = dict()
-        self._production = dict()
-        self._accumulation = dict()
+        self._consumption = _FuncDict(self)
+        self._production = _FuncDict(self)
+        self._accumulation = _FuncDict(self)
         self._inflows = defaultdict(set)
         self._outflows = defaultdict(set)
         self._clusters = dict()
 
-        self.constraints += self.balance_constraints
+        # A subclass overriding balance_constraints() but not the batched
+        # version would expect its own balance constraints.
+        cls = type(self)
+        if (cls.balance_constraints is Node.balance_constraints or
+                cls.balance_constraints_many is not Node.balance_constraints_many):
+            self.constraints += self.balance_constraints_many
+        else:
+            self.constraints += self.balance_constraints
 
         return self
 
@@ -721,6 +1088,7 @@ class Node(Part):
                 raise fs.InsanityError('this has already been done')
         else:
             self._clusters[res] = cluster
+        self._constraints_changed()
 
         if not self in cluster.children:
             cluster.add_part(self)
@@ -738,10 +1106,17 @@ class Node(Part):
         if not (res in self._clusters and self._clusters[res] is cluster):
             raise fs.InsanityError('cannot unset Cluster {} because it is not set'.format(cluster))        
         del self._clusters[res]
+        self._constraints_changed()
         if self in cluster.children:
             cluster.remove_part(self)
 
 
+    def _balance_funcs_changed(self):
+        self._constraints_changed()
+        for cluster in self._clusters.values():
+            cluster._reset_aggregations()
+
+
     def cluster(self, resource):
         """Get a :class:`Cluster` this node is in.
 
@@ -756,23 +1131,36 @@ class Node(Part):
         return self._clusters.get(resource, None)
 
 
-    def _balance_constraint(self, resource, index):
-        inflow = fs.Sum(flow(index) for flow in self.inflows[resource])
-        outflow = fs.Sum(flow(index) for flow in self.outflows[resource])
+    def _balance_funcs(self, resource):
+        # The functions of a balance constraint:
+        # (inflows, outflows, production, consumption, accumulation)
+        return (
+            tuple(self.inflows[resource]),
+            tuple(self.outflows[resource]),
+            self.production.get(resource),
+            self.consumption.get(resource),
+            self.accumulation.get(resource))
+
+    @staticmethod
+    def _balance_expr(funcs, index):
+        inflows, outflows, production, consumption, accumulation = funcs
+        lhs = fs.Sum(flow(index) for flow in inflows)
+        rhs = fs.Sum(flow(index) for flow in outflows)
 
-        lhs = inflow
-        rhs = outflow
+        if production is not None:
+            lhs += production(index)
 
-        if resource in self.production:
-            lhs += self.production[resource](index)
+        if consumption is not None:
+            rhs += consumption(index)
 
-        if resource in self.consumption:
-            rhs += self.consumption[resource](index)
+        if accumulation is not None:
+            rhs += accumulation(index)
 
-        if resource in self.accumulation:
-            rhs += self.accumulation[resource](index)
+        return fs.Eq(lhs, rhs)
 
-        return Constraint(fs.Eq(lhs, rhs), desc='Balance constraint (resource={})'.format(resource))
+    def _balance_constraint(self, resource, index):
+        expr = self._balance_expr(self._balance_funcs(resource), index)
+        return Constraint(expr, desc=_Deferred(_BALANCE_DESC.format, resource))
 
 
     @property
@@ -809,6 +1197,40 @@ class Node(Part):
         resources_to_be_balanced = (r for r in self.resources if r not in self._clusters)
         return set(self._balance_constraint(r, index) for r in resources_to_be_balanced)
 
+    @batched
+    def balance_constraints_many(self, indices):
+        """Balance constraints for all resources, at many indices.
+
+        Makes the same constraints as :meth:`balance_constraints` for each
+        index, but looks up the resources and balance functions only once.
+        This is the function in :attr:`constraints`, unless a subclass
+        overrides :meth:`balance_constraints` but not this method. Then
+        :meth:`balance_constraints` is used instead. It is :func:`batched`,
+        but the :attr:`~friendlysam.opt.Constraint.origin` of each
+        constraint says it comes from :meth:`balance_constraints` at a
+        single index.
+
+        Args:
+            indices (sequence): The indices to get the constraints for.
+
+        Returns:
+            list: The balance constraints, by resource, then by index.
+        """
+        constraints = []
+        # One origin per index, shared by the constraints of all resources.
+        origin_tuple = self.constraints._origin_tuple
+        func = self.balance_constraints
+        origins = [origin_tuple(func, index, self) for index in indices]
+        for resource in self.resources:
+            if resource in self._clusters:
+                continue
+            funcs = self._balance_funcs(resource)
+            desc = _Deferred(_BALANCE_DESC.format, resource)
+            for index, origin in zip(indices, origins):
+                constraints.append(Constraint(
+                    self._balance_expr(funcs, index), desc=desc, origin=origin))
+        return constraints
+
 
 class Cluster(Node):
     """A node containing other nodes, fully connected.
@@ -864,6 +1286,7 @@ class Cluster(Node):
             msg = '{} is not a valid resource'.format(resource)
             raise ValueError(msg).with_traceback(sys.exc_info()[2])
         self._resource = resource
+        self._reset_aggregations()
         for p in parts:
             self.add_part(p)
 
@@ -872,30 +1295,39 @@ class Cluster(Node):
         self.accumulation[self._resource] = self._get_aggr_func('accumulation')
 
 
+    def _reset_aggregations(self):
+        self._aggregated_funcs = {}
+        self._constraints_changed()
+
+    def _get_aggregated_funcs(self, attr_name):
+        # The functions to aggregate, kept until parts are added or removed,
+        # or until the balance function dicts of the parts change.
+        try:
+            return self._aggregated_funcs[attr_name]
+        except KeyError:
+            pass
+
+        funcs = []
+        for part in self.children:
+            func_dict = getattr(part, attr_name)
+            if self._resource in func_dict:
+                func = func_dict[self._resource]
+                if not callable(func):
+                    msg = 'The node {} has a non-callable value of {}[{}]: {}'.format(
+                        part,
+                        attr_name,
+                        self._resource,
+                        repr(func))
+                    raise TypeError(msg)
+                funcs.append(func)
+
+        funcs = self._aggregated_funcs[attr_name] = tuple(funcs)
+        return funcs
+
     def _get_aggr_func(self, attr_name):
         # attr_name is the attribute to aggregate, like "production", "consumption", or "accumulation"
         def aggregation(index):
-            terms = []
-            for part in self.children:
-                func_dict = getattr(part, attr_name)
-                if self._resource in func_dict:
-                    func = func_dict[self._resource]
-                    try:
-                        term = func(index)
-                        terms.append(term)
-                    except TypeError as e:
-                        if callable(func):
-                            raise
-                        else:
-                            msg = 'The node {} has a non-callable value of {}[{}]: {}'.format(
-                                part,
-                                attr_name,
-                                self._resource,
-                                repr(func))
-
-                            raise TypeError(msg) from e
-
-            return fs.Sum(terms)
+            return fs.Sum([func(index) for func in self._get_aggregated_funcs(attr_name)])
 
         return aggregation
 
@@ -917,6 +1349,7 @@ class Cluster(Node):
                 (This would generate a cyclic relationship.)
         """
         super().add_part(part)
+        self._reset_aggregations()
         if not part.cluster(self.resource) is self:
             try:
                 part.set_cluster(self) # May raise an exception.
@@ -935,6 +1368,7 @@ class Cluster(Node):
             KeyError: If the part is not there.
         """
         super().remove_part(part)
+        self._reset_aggregations()
         if part.cluster(self.resource) is not None:
             part.unset_cluster(self)
 
@@ -1122,6 +1556,8 @@ class FlowNetwork(Part):
             self._flows[(n1, n2)] = flow
             n1.outflows[self._resource].add(flow)
             n2.inflows[self._resource].add(flow)
+            n1._constraints_changed()
+            n2._constraints_changed()
 
         if bidirectional and (n2, n1) not in edges:
             self.connect(n2, n1)
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+
+"""Compile optimization problems to matrix form."""
+
+import sys
+import logging
+logger = logging.getLogger(__name__)
+
+from collections import defaultdict
+
+try:
+    import numpy
+    import scipy.sparse
+except ImportError:
+    numpy = None
+    scipy = None
+
+import friendlysam as fs
+from friendlysam.opt import _linear_terms, _DenseVariable
+from friendlysam import ConstraintError
+
+
+class MatrixProblem(object):
+    """A linear optimization problem in matrix form.
+
+    The problem is::
+
+        minimize (or maximize)  c @ x + c0
+        subject to              A @ x <= b  for the rows where sense == 'L'
+                                A @ x == b  for the rows where sense == 'E'
+                                lb <= x <= ub
+                                x[j] integer where integrality[j] == 1
+                                SOS constraints in sos
+
+    Create instances with :func:`compile_problem`. All attributes are
+    plain NumPy arrays or SciPy sparse matrices, so any solver backend
+    can use them.
+
+    Attributes:
+        variables (tuple): The :class:`~friendlysam.opt.Variable` of each column.
+        constraints (tuple): The :class:`~friendlysam.opt.Constraint` of each row.
+        A (scipy.sparse.csr_matrix): The constraint matrix.
+        b (numpy.ndarray): The right hand sides.
+        sense (numpy.ndarray): ``'L'`` (less or equal) or ``'E'`` (equal) for each row.
+        c (numpy.ndarray): The objective coefficients.
+        c0 (float): The constant term of the objective.
+        maximize (boolean): ``True`` if the objective is to be maximized.
+        lb (numpy.ndarray): Lower bounds, ``-inf`` if unbounded.
+        ub (numpy.ndarray): Upper bounds, ``inf`` if unbounded.
+        integrality (numpy.ndarray): 1 for integer columns, 0 for continuous.
+        sos (list): One ``(level, columns)`` pair for each
+            :class:`~friendlysam.opt.SOS1` or :class:`~friendlysam.opt.SOS2`,
+            where ``columns`` is an array of column numbers, in order.
+    """
+
+    def __init__(self, variables, constraints, A, b, sense, c, c0, maximize,
+                 lb, ub, integrality, sos):
+        super().__init__()
+        self.variables = variables
+        self.constraints = constraints
+        self.A = A
+        self.b = b
+        self.sense = sense
+        self.c = c
+        self.c0 = c0
+        self.maximize = maximize
+        self.lb = lb
+        self.ub = ub
+        self.integrality = integrality
+        self.sos = sos
+
+    @property
+    def shape(self):
+        """``(number of rows, number of columns)``"""
+        return self.A.shape
+
+    def solution(self, x):
+        """Make a solution from a vector of column values.
+
+        Args:
+            x (sequence): A value for each column.
+
+        Returns:
+            :class:`~friendlysam.opt.Solution`: Values keyed by
+            :class:`~friendlysam.opt.Variable`.
+        """
+        return fs.Solution(self.variables, x)
+
+
+def _relation_row(constraint):
+    # Get (terms, sense, rhs) for a constraint, or None if it is trivially true.
+    expr = constraint.expr
+    if isinstance(expr, fs.Less):
+        msg = 'Strict inequalities are not supported: {}'.format(constraint)
+        raise ConstraintError(msg, constraint=constraint)
+    if isinstance(expr, fs.LessEqual):
+        sense = 'L'
+    elif isinstance(expr, fs.Eq):
+        sense = 'E'
+    else:
+        raise ConstraintError('Cannot handle constraint {}'.format(constraint), constraint=constraint)
+
+    lhs, rhs = expr.args
+    try:
+        terms, constant = _linear_terms(fs.Sub(lhs, rhs))
+    except TypeError as e:
+        raise ConstraintError('{} is not linear'.format(constraint), constraint=constraint) from e
+
+    terms = {v: coef for v, coef in terms.items() if coef != 0}
+    if not terms:
+        if (constant <= 0) if sense == 'L' else (constant == 0):
+            return None
+        msg = ('The expression in {} evaluates to False, '
+            'so the problem is infeasible.').format(constraint)
+        raise ConstraintError(msg, constraint=constraint)
+
+    return terms, sense, -constant
+
+
+def _bounds(variables):
+    # Bounds and integrality of the variables. Variables of dense collections
+    # are handled with one array operation per collection.
+    n = len(variables)
+    lb = numpy.empty(n)
+    ub = numpy.empty(n)
+    integrality = numpy.zeros(n, dtype=numpy.int8)
+
+    dense = defaultdict(lambda: ([], []))
+    for j, v in enumerate(variables):
+        if isinstance(v, _DenseVariable):
+            columns, ids = dense[v._collection]
+            columns.append(j)
+            ids.append(v._id)
+        else:
+            lb[j] = -numpy.inf if v.lb is None else v.lb
+            ub[j] = numpy.inf if v.ub is None else v.ub
+        if v.domain in (fs.Domain.integer, fs.Domain.binary):
+            integrality[j] = 1
+
+    for collection, (columns, ids) in dense.items():
+        lb[columns] = collection._lb[ids]
+        ub[columns] = collection._ub[ids]
+
+    binary = [j for j, v in enumerate(variables) if v.domain == fs.Domain.binary]
+    lb[binary] = numpy.maximum(lb[binary], 0)
+    ub[binary] = numpy.minimum(ub[binary], 1)
+
+    return lb, ub, integrality
+
+
+def compile_problem(problem):
+    """Compile a :class:`~friendlysam.opt.Problem` to a :class:`MatrixProblem`.
+
+    Makes one pass over the objective and the constraints. Each column is a
+    :class:`~friendlysam.opt.Variable` without value, and each row is a
+    :class:`~friendlysam.opt.Constraint`. Variables with values are
+    treated as constants. Constraints that are trivially true are left out.
+
+    Requires NumPy and SciPy.
+
+    Args:
+        problem (:class:`~friendlysam.opt.Problem`): The problem to compile.
+
+    Returns:
+        :class:`MatrixProblem`
+
+    Raises:
+        ConstraintError: If some constraint is not linear, is a strict
+            inequality, or is trivially false.
+
+    Examples:
+
+        >>> from friendlysam import Variable, Problem, Maximize
+        >>> x, y = Variable('x', lb=0), Variable('y', lb=0)
+        >>> prob = Problem()
+        >>> prob.objective = Maximize(x + 2 * y)
+        >>> prob += (3 * x + y <= 5)
+        >>> matrix_problem = compile_problem(prob)
+        >>> matrix_problem.A.toarray()
+        array([[3., 1.]])
+        >>> matrix_problem.b, matrix_problem.c
+        (array([5.]), array([1., 2.]))
+    """
+    if scipy is None:
+        raise RuntimeError('numpy and scipy are needed for this function').with_traceback(sys.exc_info()[2])
+
+    columns = {}
+    def column(v):
+        try:
+            return columns[v]
+        except KeyError:
+            j = columns[v] = len(columns)
+            return j
+
+    objective = problem.objective
+    if isinstance(objective, fs.Minimize):
+        maximize = False
+    elif isinstance(objective, fs.Maximize):
+        maximize = True
+    else:
+        raise RuntimeError('Unexpected objective {}'.format(objective))
+    objective_terms, c0 = _linear_terms(objective.expr)
+    objective_terms = [(column(v), coef) for v, coef in objective_terms.items()]
+
+    row_indices, col_indices, data = [], [], []
+    b, sense, constraints, sos = [], [], [], []
+    for c in problem.constraints:
+        if isinstance(c, fs.Constraint):
+            row = _relation_row(c)
+            if row is None:
+                continue
+            terms, row_sense, rhs = row
+            i = len(constraints)
+            for v, coef in terms.items():
+                row_indices.append(i)
+                col_indices.append(column(v))
+                data.append(coef)
+            constraints.append(c)
+            sense.append(row_sense)
+            b.append(rhs)
+        elif isinstance(c, (fs.SOS1, fs.SOS2)):
+            sos.append((c.level, [v for v in c.variables if not hasattr(v, 'value')]))
+        else:
+            raise NotImplementedError('Cannot handle constraint {}'.format(c))
+
+    for v in problem.variables_without_value():
+        column(v)
+    sos = [(level, numpy.array([column(v) for v in variables], dtype=numpy.intp))
+        for level, variables in sos]
+
+    variables = tuple(columns)
+    n = len(variables)
+    A = scipy.sparse.csr_matrix(
+        (numpy.array(data, dtype=float), (row_indices, col_indices)),
+        shape=(len(constraints), n))
+    c = numpy.zeros(n)
+    for j, coef in objective_terms:
+        c[j] += coef
+    lb, ub, integrality = _bounds(variables)
+
+    return MatrixProblem(
+        variables=variables,
+        constraints=tuple(constraints),
+        A=A,
+        b=numpy.array(b, dtype=float),
+        sense=numpy.array(sense, dtype='<U1'),
+        c=c,
+        c0=float(c0),
+        maximize=maximize,
+        lb=lb,
+        ub=ub,
+        integrality=integrality,
+        sos=sos)
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+"""Solver engine using HiGHS in a pool of worker processes."""
+
+import sys
+import logging
+logger = logging.getLogger(__name__)
+
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy
+    from scipy.optimize import milp, LinearConstraint, Bounds
+except ImportError:
+    numpy = None
+    milp = None
+
+from friendlysam import SolverError
+from friendlysam.solvers.matrix import compile_problem
+
+DEFAULT_OPTIONS = dict(
+    processes=None,
+    time_limit=None)
+
+
+def _solve_arrays(arrays, time_limit):
+    # Solve a problem given as plain arrays with scipy's HiGHS binding.
+    # Runs in the worker processes, so it only gets picklable arrays.
+    A, b, sense, c, maximize, lb, ub, integrality = arrays
+    constraints = ()
+    if A.shape[0] > 0:
+        lower = numpy.where(sense == 'E', b, -numpy.inf)
+        constraints = LinearConstraint(A, lower, b)
+    options = {} if time_limit is None else dict(time_limit=time_limit)
+    result = milp(
+        -c if maximize else c,
+        constraints=constraints,
+        bounds=Bounds(lb, ub),
+        integrality=integrality,
+        options=options)
+    return result.status, result.message, result.x
+
+
+class PoolSolver(object):
+    """Solver engine using HiGHS, through SciPy, in a pool of worker processes.
+
+    Problems are compiled to matrix form with
+    :func:`~friendlysam.solvers.matrix.compile_problem` in the calling
+    process, and solved in worker processes which are started once and
+    then kept, so there is no process to start and no files to write for
+    each problem. This is useful for many small problems. Use
+    :meth:`solve_many` to solve several problems in parallel.
+
+    SOS constraints are not supported.
+
+    Args:
+        options (dict): Options for the engine. Supported keys are
+
+            * ``'processes'``: The number of worker processes. Default is
+              ``None``, meaning the number of CPUs. If ``0``, problems
+              are solved in the calling process.
+            * ``'time_limit'``: A time limit in seconds for each problem.
+              Default is ``None``, no limit.
+    """
+
+    def __init__(self, options):
+        super().__init__()
+        if milp is None:
+            raise RuntimeError('numpy and scipy are needed for this solver').with_traceback(sys.exc_info()[2])
+        self.options = DEFAULT_OPTIONS.copy()
+        self.options.update(options)
+        self._executor = None
+
+    def __getstate__(self):
+        return self.options
+
+    def __setstate__(self, options):
+        self.__init__(options)
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.options['processes'])
+        return self._executor
+
+    def close(self):
+        """Shut down the worker processes.
+
+        They are started again if needed."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def solve(self, problem, start=None):
+        """Solve a problem.
+
+        Args:
+            problem (:class:`~friendlysam.opt.Problem`): The problem to solve.
+            start (dict, optional): Ignored, since SciPy does not pass MIP
+                starts on to HiGHS. It is accepted so that this solver can
+                be used in a :class:`~friendlysam.models.MyopicDispatchModel`
+                with ``warm_start=True``.
+
+        Returns:
+            :class:`~friendlysam.opt.Solution`: The value of each variable
+            without value in the problem.
+
+        Raises:
+            SolverError: If the problem could not be solved to optimality,
+                or has SOS constraints.
+            ConstraintError: If some constraint is not linear, is a strict
+                inequality, or is trivially false.
+        """
+        return self.solve_many([problem])[0]
+
+    def solve_many(self, problems):
+        """Solve several problems in parallel.
+
+        Args:
+            problems (iterable): The :class:`~friendlysam.opt.Problem`
+                instances to solve.
+
+        Returns:
+            list: A :class:`~friendlysam.opt.Solution` for each problem, in order.
+
+        Raises:
+            The same exceptions as :meth:`solve`, for the first problem
+            that fails.
+        """
+        compiled = [self._compile(problem) for problem in problems]
+        time_limit = self.options['time_limit']
+        if self.options['processes'] == 0:
+            results = [_solve_arrays(arrays, time_limit) for mp, arrays in compiled]
+        else:
+            executor = self._get_executor()
+            futures = [executor.submit(_solve_arrays, arrays, time_limit) for mp, arrays in compiled]
+            results = [future.result() for future in futures]
+
+        solutions = []
+        for (mp, arrays), (status, message, x) in zip(compiled, results):
+            if status != 0:
+                raise SolverError("HiGHS did not solve the problem: '{}'".format(message))
+            solutions.append(mp.solution(x))
+        return solutions
+
+    def _compile(self, problem):
+        mp = compile_problem(problem)
+        if mp.sos:
+            raise SolverError('SOS constraints are not supported by this solver')
+        arrays = (mp.A, mp.b, mp.sense, mp.c, mp.maximize, mp.lb, mp.ub, mp.integrality)
+        return mp, arrays
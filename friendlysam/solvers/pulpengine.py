@@ -3,7 +3,10 @@
 import logging
 logger = logging.getLogger(__name__)
 
+import os
+import asyncio
 import operator
+import tempfile
 import collections
 from itertools import chain
 
@@ -13,13 +16,20 @@ import friendlysam as fs
 from friendlysam import SolverError, ConstraintError
 
 
-def _cbc_solve(problem):
-    solver = PULP_CBC_CMD()
+# MIP starts (warmStart and LpVariable.setInitialValue) came in PuLP 2.0.
+_HAS_WARM_START = hasattr(LpVariable, 'setInitialValue')
+
+def _cbc_solve(problem, warm_start=False):
+    solver = PULP_CBC_CMD(warmStart=True) if warm_start else PULP_CBC_CMD()
     return solver.solve_CBC(problem, use_mps=False)
 
+def _gurobi_cmd_solve(problem, warm_start=False):
+    solver = GUROBI_CMD(msg=0, warmStart=True) if warm_start else GUROBI_CMD(msg=0)
+    return solver.solve(problem)
+
 _SOLVER_FUNCS = {
     'cbc': _cbc_solve,
-    'gurobi_cmd': GUROBI_CMD(msg=0).solve
+    'gurobi_cmd': _gurobi_cmd_solve
     }
 DEFAULT_OPTIONS = dict(
     solver=['cbc', 'gurobi_cmd'])
@@ -39,8 +49,35 @@ _pulp_statuses = {
     LpStatusUndefined: 'LpStatusUndefined'
 }
 
+def _read_cbc_values(lines):
+    # Read the values of rows and columns from the lines of a CBC solution
+    # file, after the status line. Infeasible values are marked with '**'.
+    values = {}
+    for line in lines:
+        fields = line.split()
+        if fields and fields[0] == '**':
+            del fields[0]
+        if len(fields) >= 3:
+            values[fields[1]] = float(fields[2])
+    return values
+
+
 class PulpSolver(object):
-    """docstring for PulpSolver"""
+    """Solver engine using PuLP.
+
+    Args:
+        options (dict): Options for the engine. Supported keys are
+
+            * ``'solver'``: A solver name or a list of names to try, in
+              order. Default ``['cbc', 'gurobi_cmd']``.
+            * ``'incremental'``: If ``True`` (default), keep the PuLP model
+              between calls to :meth:`solve`. Constraints that were also in
+              the previous problem are kept as they are, so repeated solves
+              of similar problems, like in a
+              :class:`~friendlysam.models.MyopicDispatchModel`, only pay for
+              the constraints that changed. If some constraints were
+              removed, a new PuLP model is made from the ones that are kept.
+    """
 
     def __init__(self, options):
         super().__init__()
@@ -49,6 +86,7 @@ class PulpSolver(object):
         self._last_problem_vars = {}
         self._last_problem_expressions = {}
         self._var_counter = 0
+        self._reset_model()
 
     def __getstate__(self):
         return self.options
@@ -56,7 +94,17 @@ class PulpSolver(object):
     def __setstate__(self, options):
         self.__init__(options)
 
-
+    def _reset_model(self):
+        self._model = None
+        # Names of pulp constraints in self._model, keyed by the expressions
+        # they came from. Only expressions without any valued variables are
+        # kept here, since the others change when variables get values.
+        self._constraint_names = {}
+        self._volatile_names = []
+        self._constraint_counter = 0
+        # The pulp constraints in self._model, keyed by name. Kept here
+        # since the mapping of LpProblem.constraints is deprecated in pulp.
+        self._pulp_constraints = {}
 
     def _make_pulp_var(self, variable):
         options = dict(
@@ -69,11 +117,55 @@ class PulpSolver(object):
 
         return LpVariable(name, **options)
 
+    def _update_pulp_var(self, pulp_var, variable):
+        pulp_var.lowBound = variable.lb
+        pulp_var.upBound = variable.ub
+        pulp_var.cat = _domain_mapping[variable.domain]
+
     _evaluators = fs.CONCRETE_EVALUATORS.copy()
     _evaluators[fs.Sum] = lambda *x: pulp.lpSum(x)
-
-
-    def solve(self, problem):
+    _evaluators[fs.LinearExpr] = lambda constant, *args: (
+        pulp.lpSum(var * coef for var, coef in zip(args[0::2], args[1::2])) + constant)
+
+
+    def _get_model(self, sense):
+        if self._model is None or not self.options.get('incremental', True):
+            self._reset_model()
+            self._model = LpProblem('friendlysam', sense)
+        self._model.sense = sense
+        return self._model
+
+    def _set_start(self, pulp_vars, start):
+        # Set initial values of the pulp variables, for a MIP start. Values
+        # outside the bounds are left out, like the missing ones.
+        for v, pv in pulp_vars.items():
+            value = start.get(v)
+            if value is None or not pv.setInitialValue(value, check=False):
+                pv.varValue = None
+
+    def solve(self, problem, start=None):
+        """Solve a problem.
+
+        Args:
+            problem (:class:`~friendlysam.opt.Problem`): The problem to solve.
+            start (dict, optional): Initial values of variables, like the
+                solution of a similar problem. If given, they are passed on
+                as a MIP start to the solver. The start does not have to be
+                complete or feasible, but the solver ignores a start that it
+                cannot make a feasible solution from. Variables which are not
+                in the problem are ignored. MIP starts need PuLP 2.0 or
+                later. With older versions, like the 1.5.8 in the
+                requirements of friendlysam, a warning is logged and the
+                start is not used.
+
+        Returns:
+            :class:`~friendlysam.opt.Solution`: The value of each variable
+            without value in the problem.
+
+        Raises:
+            SolverError: If no solver worked, or the problem could not be
+                solved to optimality.
+        """
         expressions = {}
         cached_expressions = self._last_problem_expressions
         def evaluate(expr):
@@ -91,6 +183,7 @@ class PulpSolver(object):
         for v in problem.variables_without_value():
             try:
                 pulp_vars[v] = cached_vars[v]
+                self._update_pulp_var(pulp_vars[v], v)
             except KeyError:
                 pulp_vars[v] = self._make_pulp_var(v)
         self._last_problem_vars = pulp_vars
@@ -102,12 +195,140 @@ class PulpSolver(object):
         else:
             raise RuntimeError('Unexpected objective {}'.format(problem.objective))
 
-        model = LpProblem('friendlysam', sense)
+        model = self._get_model(sense)
+        try:
+            constraint_names = self._update_model(model, problem, evaluate, pulp_vars)
+        except Exception:
+            self._reset_model()
+            raise
+        model = self._model # May have been rebuilt
+
+        self._last_problem_expressions = expressions
+
+        exceptions = []
+        if isinstance(self.options['solver'], str):
+            self.options['solver'] = [self.options['solver']]
+
+        if start is not None and not _HAS_WARM_START:
+            logger.warning('MIP starts need PuLP 2.0 or later, solving without start')
+            start = None
+        if start is not None:
+            self._set_start(pulp_vars, start)
+
+        for name in self.options['solver']:
+            try:
+                status = _SOLVER_FUNCS[name](model, warm_start=start is not None)
+                break
+            except Exception as e:
+                exceptions.append({'solver': name, 'exception': str(e)})
+        else:
+            raise SolverError('None of the solvers worked. More info: {}'.format(exceptions))
         
-        model += evaluate(problem.objective.expr)
+        # It would be nice to provide some more info here...
+        if not status == LpStatusOptimal:
+            raise fs.SolverError("pulp solution status is '{0}'".format(_pulp_statuses[status]))
+
+        values = [pv.value() for pv in pulp_vars.values()]
+        assert None not in values
+        duals = {}
+        for c, name in constraint_names.items():
+            dual = self._pulp_constraints[name].pi
+            if dual is not None:
+                duals[c] = dual
+        reduced_costs = [pv.dj for pv in pulp_vars.values()]
+        if None in reduced_costs:
+            reduced_costs = None
+        return fs.Solution(pulp_vars.keys(), values, duals=duals, reduced_costs=reduced_costs)
+
+    async def solve_async(self, problem):
+        """Solve a problem without blocking the event loop.
+
+        The problem is written to an MPS file in the calling thread, and
+        then CBC is run as an ``asyncio`` subprocess. While CBC runs, the
+        event loop is free to do other things, like building the next
+        problem or running other solves. Call it in a task to get a
+        future, e.g. ``asyncio.ensure_future(solver.solve_async(problem))``.
+
+        The PuLP model kept by :meth:`solve` is not used, so several calls
+        to this method may run at once on the same solver.
+
+        Args:
+            problem (:class:`~friendlysam.opt.Problem`): The problem to solve.
+
+        Returns:
+            :class:`~friendlysam.opt.Solution`: The value of each variable
+            without value in the problem.
+
+        Raises:
+            SolverError: If ``'cbc'`` is not among the solvers in the
+                options, or the problem could not be solved to optimality.
+            ConstraintError: If some constraint is not linear, is a strict
+                inequality, or is trivially false.
+
+        Examples:
+
+            async def solve_all(solver, problems):
+                return await asyncio.gather(
+                    *(solver.solve_async(p) for p in problems))
+
+            solutions = asyncio.get_event_loop().run_until_complete(
+                solve_all(fs.get_solver(), problems))
+        """
+        solvers = self.options['solver']
+        if 'cbc' not in ([solvers] if isinstance(solvers, str) else solvers):
+            raise SolverError('solve_async() only works with cbc')
+
+        with tempfile.TemporaryDirectory() as directory:
+            problem_path = os.path.join(directory, 'problem.mps')
+            solution_path = os.path.join(directory, 'solution.sol')
+            columns = problem.write_mps(problem_path)
+
+            args = [problem_path]
+            if isinstance(problem.objective, fs.Maximize):
+                args.append('max')
+            args += ['solve', 'printingOptions', 'all', 'solution', solution_path]
+            process = await asyncio.create_subprocess_exec(
+                PULP_CBC_CMD().path, *args,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+            output, _ = await process.communicate()
+            if process.returncode != 0 or not os.path.exists(solution_path):
+                raise SolverError('cbc failed with output: {}'.format(
+                    output.decode(errors='replace')))
+            with open(solution_path) as f:
+                status_line = f.readline()
+                values = _read_cbc_values(f)
+
+        if not status_line.startswith('Optimal'):
+            raise SolverError("cbc solution status is '{}'".format(status_line.strip()))
+
+        return fs.Solution(columns, [values.get('x{}'.format(j), 0.) for j in range(len(columns))])
+
+    def _update_model(self, model, problem, evaluate, pulp_vars):
+        # Bring the model up to date with problem, keeping the constraints
+        # that are still there and removing the others. Returns the names
+        # of the pulp constraints, keyed by constraint. If constraints were
+        # removed, self._model is replaced by a new model.
+        constraint_names = {}
+        model.setObjective(evaluate(problem.objective.expr))
+
+        old_names = self._constraint_names
+        old_volatile_names = self._volatile_names
+        names = self._constraint_names = {}
+        volatile_names = self._volatile_names = []
+        model.sos1.clear()
+        model.sos2.clear()
 
         for i, c in enumerate(problem.constraints):
             if isinstance(c, fs.Constraint):
+                if c.expr in names:
+                    constraint_names[c] = names[c.expr]
+                    continue
+
+                volatile = any(hasattr(v, 'value') for v in c.expr.variables)
+                if not volatile and c.expr in old_names:
+                    names[c.expr] = constraint_names[c] = old_names.pop(c.expr)
+                    continue
+
                 try:
                     expr = evaluate(c.expr)
                     if type(expr) == bool: # Because __eq__ is overloaded on pulp expressions
@@ -117,13 +338,22 @@ class PulpSolver(object):
                             msg = ('The expression in {} evaluates to False, '
                                 'so the problem is infeasible.').format(c)
                             raise ConstraintError(msg, constraint=c)
-                    model += expr
-                except Exception:
+                    constr_name = 'c{}'.format(self._constraint_counter)
+                    self._constraint_counter += 1
+                    model.addConstraint(expr, constr_name)
+                    self._pulp_constraints[constr_name] = expr
+                except Exception as e:
                     if isinstance(expr, fs.Less):
                         msg = 'Strict inequalities are not supported by this solver: {}'.format(c)
                         raise ConstraintError(msg, constraint=c) from e
                     raise
 
+                if volatile:
+                    volatile_names.append(constr_name)
+                else:
+                    names[c.expr] = constr_name
+                constraint_names[c] = constr_name
+
             elif isinstance(c, (fs.SOS1, fs.SOS2)):
                 if isinstance(c, fs.SOS1):
                     sosdict = model.sos1
@@ -139,25 +369,25 @@ class PulpSolver(object):
             else:
                 raise NotImplementedError('Cannot handle constraint {}'.format(c))
 
-        self._last_problem_expressions = expressions
-
-        exceptions = []
-        if isinstance(self.options['solver'], str):
-            self.options['solver'] = [self.options['solver']]
-
-        for name in self.options['solver']:
-            try:
-                status = _SOLVER_FUNCS[name](model)
-                break
-            except Exception as e:
-                exceptions.append({'solver': name, 'exception': str(e)})
-        else:
-            raise SolverError('None of the solvers worked. More info: {}'.format(exceptions))
-        
-        # It would be nice to provide some more info here...
-        if not status == LpStatusOptimal:
-            raise fs.SolverError("pulp solution status is '{0}'".format(_pulp_statuses[status]))
-
-        for pv in pulp_vars.values():
-            assert pv.value() is not None
-        return {v: pv.value() for v, pv in pulp_vars.items()}
+        removed = list(chain(old_names.values(), old_volatile_names))
+        if removed:
+            for constr_name in removed:
+                del self._pulp_constraints[constr_name]
+            self._model = self._rebuild_model(model)
+
+        return constraint_names
+
+    def _rebuild_model(self, model):
+        # A new model with the objective and SOS sets of model and the pulp
+        # constraints in self._pulp_constraints. Pulp has no supported way
+        # to remove constraints, so any removal rebuilds the model. This
+        # only adds the pulp constraints that are already made, which is
+        # cheap compared to evaluating them (see benchmarks/incremental.py),
+        # and variables that were only in removed constraints are dropped.
+        new_model = LpProblem(model.name, model.sense)
+        new_model.setObjective(model.objective)
+        for constr_name, constraint in self._pulp_constraints.items():
+            new_model.addConstraint(constraint, constr_name)
+        new_model.sos1.update(model.sos1)
+        new_model.sos2.update(model.sos2)
+        return new_model
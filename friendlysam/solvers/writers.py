@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+
+"""Write optimization problems to LP and MPS files."""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import math
+from array import array
+
+import friendlysam as fs
+from friendlysam.opt import _linear_terms
+from friendlysam.solvers.matrix import _relation_row
+
+_BUFFER_SIZE = 1 << 20
+_OBJECTIVE_NAME = 'obj'
+# LP files may not have lines longer than 510 characters. Like PuLP, we
+# break lines well before that.
+_LP_LINE_LENGTH = 78
+
+def _number(value):
+    return repr(float(value))
+
+
+class _Columns(object):
+    """Names of the columns, given out in order of first appearance."""
+
+    def __init__(self):
+        super().__init__()
+        self.variables = []
+        self.ids = {}
+
+    def __call__(self, variable):
+        try:
+            return self.ids[variable]
+        except KeyError:
+            j = self.ids[variable] = len(self.variables)
+            self.variables.append(variable)
+            return j
+
+    def name(self, j):
+        return 'x{}'.format(j)
+
+    def add_remaining(self, problem):
+        # Variables without value, which are not in the objective or
+        # any of the constraints, after simplification.
+        for v in problem.variables_without_value():
+            self(v)
+
+
+def _sense(problem):
+    objective = problem.objective
+    if isinstance(objective, fs.Minimize):
+        return 'Minimize'
+    elif isinstance(objective, fs.Maximize):
+        return 'Maximize'
+    raise RuntimeError('Unexpected objective {}'.format(objective))
+
+
+def _rows(problem, columns):
+    # Generate (terms, sense, rhs, constraint) for each constraint that is
+    # not trivially true, where terms is a list of (column, coefficient).
+    for c in problem.constraints:
+        if isinstance(c, fs.Constraint):
+            row = _relation_row(c)
+            if row is None:
+                continue
+            terms, sense, rhs = row
+            yield [(columns(v), coef) for v, coef in terms.items()], sense, rhs, c
+        elif not isinstance(c, (fs.SOS1, fs.SOS2)):
+            raise NotImplementedError('Cannot handle constraint {}'.format(c))
+
+
+def _sos_sets(problem, columns):
+    for c in problem.constraints:
+        if isinstance(c, (fs.SOS1, fs.SOS2)):
+            yield c.level, [columns(v) for v in c.variables if not hasattr(v, 'value')]
+
+
+def _bounds(variable):
+    lb = -math.inf if variable.lb is None else variable.lb
+    ub = math.inf if variable.ub is None else variable.ub
+    if variable.domain == fs.Domain.binary:
+        lb, ub = max(lb, 0), min(ub, 1)
+    return lb, ub
+
+
+def _lp_expression(terms, columns):
+    for j, coef in terms:
+        sign = '-' if coef < 0 else '+'
+        yield '{} {} {}'.format(sign, _number(abs(coef)), columns.name(j))
+
+
+def _write_lp_line(f, parts):
+    # Write the parts separated by spaces, breaking the line between parts
+    # where it would get longer than _LP_LINE_LENGTH.
+    length = 0
+    for part in parts:
+        if length and length + 1 + len(part) > _LP_LINE_LENGTH:
+            f.write('\n')
+            length = 0
+        elif length:
+            f.write(' ')
+            length += 1
+        f.write(part)
+        length += len(part)
+    f.write('\n')
+
+
+def write_lp(problem, path):
+    """Write a problem to a file in CPLEX LP format.
+
+    The constraints are written one by one as they are compiled, so the
+    whole problem is never kept in memory. The columns are named ``x0``,
+    ``x1``, etc., and the rows ``c0``, ``c1``, etc. Long expressions are
+    broken over several lines, since LP files may not have lines longer
+    than 510 characters.
+
+    Args:
+        problem (:class:`~friendlysam.opt.Problem`): The problem to write.
+        path (str): The file to write.
+
+    Returns:
+        list: The :class:`~friendlysam.opt.Variable` of each column, in order.
+
+    Raises:
+        ConstraintError: If some constraint is not linear, is a strict
+            inequality, or is trivially false.
+    """
+    columns = _Columns()
+    objective_terms, constant = _linear_terms(problem.objective.expr)
+    objective_terms = [(columns(v), coef) for v, coef in objective_terms.items()]
+
+    with open(path, 'w', buffering=_BUFFER_SIZE) as f:
+        f.write('\\* friendlysam *\\\n')
+        f.write('{}\n'.format(_sense(problem)))
+        parts = [' {}:'.format(_OBJECTIVE_NAME)]
+        parts.extend(_lp_expression(objective_terms, columns))
+        if constant or not objective_terms:
+            parts.append('{} {}'.format('-' if constant < 0 else '+', _number(abs(constant))))
+        _write_lp_line(f, parts)
+        f.write('Subject To\n')
+
+        for i, (terms, sense, rhs, constraint) in enumerate(_rows(problem, columns)):
+            parts = [' c{}:'.format(i)]
+            parts.extend(_lp_expression(terms, columns))
+            parts.append('{} {}'.format('<=' if sense == 'L' else '=', _number(rhs)))
+            _write_lp_line(f, parts)
+
+        sos_sets = list(_sos_sets(problem, columns))
+        columns.add_remaining(problem)
+
+        f.write('Bounds\n')
+        for j, v in enumerate(columns.variables):
+            lb, ub = _bounds(v)
+            name = columns.name(j)
+            if lb == ub:
+                f.write(' {} = {}\n'.format(name, _number(lb)))
+            elif lb == -math.inf and ub == math.inf:
+                f.write(' {} free\n'.format(name))
+            else:
+                f.write(' {} <= {} <= {}\n'.format(_number(lb), name, _number(ub)))
+
+        integers = [j for j, v in enumerate(columns.variables)
+            if v.domain in (fs.Domain.integer, fs.Domain.binary)]
+        if integers:
+            f.write('Generals\n')
+            for j in integers:
+                f.write(' {}\n'.format(columns.name(j)))
+
+        if sos_sets:
+            f.write('SOS\n')
+            for k, (level, sos_columns) in enumerate(sos_sets):
+                parts = [' s{}: S{}::'.format(k, level)]
+                parts.extend('{}:{}'.format(columns.name(j), w) for w, j in enumerate(sos_columns, 1))
+                _write_lp_line(f, parts)
+
+        f.write('End\n')
+
+    return columns.variables
+
+
+def write_mps(problem, path, objsense=False):
+    """Write a problem to a file in free MPS format.
+
+    The ``ROWS`` section is written while the constraints are compiled.
+    Since MPS files list the coefficients column by column, the
+    coefficients are kept in compact arrays until the ``COLUMNS`` section
+    is written. No other representation of the problem is built. The
+    columns are named ``x0``, ``x1``, etc., and the rows ``c0``, ``c1``,
+    etc.
+
+    Some solvers, like CBC, do not read the sense of the objective from MPS
+    files. By default, the sense is written in a comment line
+    ``*SENSE:Maximize`` or ``*SENSE:Minimize``, like PuLP does, and must
+    be passed to the solver separately, e.g. ``cbc file.mps max solve``.
+
+    Args:
+        problem (:class:`~friendlysam.opt.Problem`): The problem to write.
+        path (str): The file to write.
+        objsense (boolean, optional): Write an ``OBJSENSE`` section instead
+            of the comment line.
+
+    Returns:
+        list: The :class:`~friendlysam.opt.Variable` of each column, in order.
+
+    Raises:
+        ConstraintError: If some constraint is not linear, is a strict
+            inequality, or is trivially false.
+    """
+    columns = _Columns()
+    objective_terms, constant = _linear_terms(problem.objective.expr)
+    objective = {columns(v): coef for v, coef in objective_terms.items()}
+
+    # The coefficients, as (row, column, value) in three arrays.
+    row_ids, col_ids, values = array('l'), array('l'), array('d')
+    rhs = array('d')
+
+    with open(path, 'w', buffering=_BUFFER_SIZE) as f:
+        sense = _sense(problem)
+        if objsense:
+            f.write('OBJSENSE\n    {}\n'.format(sense[:3].upper()))
+        else:
+            f.write('*SENSE:{}\n'.format(sense))
+        f.write('NAME friendlysam\nROWS\n N {}\n'.format(_OBJECTIVE_NAME))
+        for i, (terms, sense, b, constraint) in enumerate(_rows(problem, columns)):
+            f.write(' {} c{}\n'.format(sense, i))
+            for j, coef in terms:
+                row_ids.append(i)
+                col_ids.append(j)
+                values.append(coef)
+            rhs.append(b)
+
+        sos_sets = list(_sos_sets(problem, columns))
+        columns.add_remaining(problem)
+        n = len(columns.variables)
+
+        # Counting sort of the coefficients by column.
+        starts = array('l', [0]) * (n + 1)
+        for j in col_ids:
+            starts[j + 1] += 1
+        for j in range(n):
+            starts[j + 1] += starts[j]
+        order = array('l', [0]) * len(col_ids)
+        position = array('l', starts)
+        for k, j in enumerate(col_ids):
+            order[position[j]] = k
+            position[j] += 1
+        del position
+
+        f.write('COLUMNS\n')
+        integer = False
+        for j, v in enumerate(columns.variables):
+            name = columns.name(j)
+            is_integer = v.domain in (fs.Domain.integer, fs.Domain.binary)
+            if is_integer != integer:
+                f.write("    MARKER 'MARKER' '{}'\n".format('INTORG' if is_integer else 'INTEND'))
+                integer = is_integer
+            coef = objective.get(j, 0)
+            if coef or starts[j] == starts[j + 1]:
+                f.write('    {} {} {}\n'.format(name, _OBJECTIVE_NAME, _number(coef)))
+            for k in order[starts[j]:starts[j + 1]]:
+                f.write('    {} c{} {}\n'.format(name, row_ids[k], _number(values[k])))
+        if integer:
+            f.write("    MARKER 'MARKER' 'INTEND'\n")
+
+        f.write('RHS\n')
+        if constant:
+            f.write('    RHS {} {}\n'.format(_OBJECTIVE_NAME, _number(-constant)))
+        for i, b in enumerate(rhs):
+            if b:
+                f.write('    RHS c{} {}\n'.format(i, _number(b)))
+
+        f.write('BOUNDS\n')
+        for j, v in enumerate(columns.variables):
+            lb, ub = _bounds(v)
+            name = columns.name(j)
+            if lb == ub:
+                f.write(' FX BND {} {}\n'.format(name, _number(lb)))
+            elif lb == -math.inf and ub == math.inf:
+                f.write(' FR BND {}\n'.format(name))
+            else:
+                if lb == -math.inf:
+                    f.write(' MI BND {}\n'.format(name))
+                elif lb != 0 or v.domain != fs.Domain.real:
+                    f.write(' LO BND {} {}\n'.format(name, _number(lb)))
+                if ub != math.inf:
+                    f.write(' UP BND {} {}\n'.format(name, _number(ub)))
+                elif v.domain != fs.Domain.real:
+                    f.write(' PL BND {}\n'.format(name))
+
+        if sos_sets:
+            f.write('SOS\n')
+            for k, (level, sos_columns) in enumerate(sos_sets):
+                f.write(' S{} SOS s{} 1\n'.format(level, k))
+                for w, j in enumerate(sos_columns, 1):
+                    f.write('    {} {}\n'.format(columns.name(j), w))
+
+        f.write('ENDATA\n')
+
+    return columns.variables
@@ -97,3 +97,84 @@ def test_balance_simple():
 
     # Raises SolverError because the consumer wants to consume but noone delivers
     solution = default_solver.solve(prob)
+
+
+def test_cluster_aggregation_updates():
+    x = fs.VariableCollection('x')
+    y = fs.VariableCollection('y')
+    n1, n2 = Node(), Node()
+    n1.production[RESOURCE] = x
+    c = Cluster(n1, resource=RESOURCE)
+    production = c.production[RESOURCE]
+    assert set(production(0).variables) == {x(0)}
+
+    c.add_part(n2)
+    assert set(production(0).variables) == {x(0)}
+    n2.production[RESOURCE] = y
+    assert set(production(0).variables) == {x(0), y(0)}
+    n2.production.update({RESOURCE: lambda t: 2 * y(t)})
+    assert set(production(1).variables) == {x(1), y(1)}
+
+    del n1.production[RESOURCE]
+    assert set(production(0).variables) == {y(0)}
+    c.remove_part(n2)
+    assert production(0) == 0
+
+
+@raises(TypeError)
+def test_cluster_non_callable():
+    n = Node()
+    n.consumption[RESOURCE] = 3
+    c = Cluster(n, resource=RESOURCE)
+    c.consumption[RESOURCE](0)
+
+
+def test_balance_constraints_many():
+    consumption = lambda t: t * 1.5
+    p = Producer(name='Producer')
+    c = Consumer(consumption, name='Consumer')
+    times = range(4)
+
+    for node in (p, c):
+        constraints = node.balance_constraints_many(times)
+        single = set.union(*(node.balance_constraints(t) for t in times))
+        assert {c.expr for c in constraints} == {c.expr for c in single}
+        for constraint in constraints:
+            assert constraint.origin.func == node.balance_constraints
+            assert constraint.origin.index in times
+            assert constraint.desc == 'Balance constraint (resource={})'.format(RESOURCE)
+        # The origins are shared between resources, not made per constraint.
+        assert len({id(c.origin) for c in constraints}) == len(times)
+
+    cl = Cluster(p, c, resource=RESOURCE)
+    assert p.balance_constraints_many(times) == []
+    assert len(cl.balance_constraints_many(times)) == len(times)
+
+
+def test_overridden_balance_constraints():
+    x = fs.VariableCollection('x')
+
+    class Custom(Node):
+        def balance_constraints(self, index):
+            return {fs.Constraint(x(index) <= 1, desc='Custom balance')}
+
+    class CustomBatched(Custom):
+        @fs.batched
+        def balance_constraints_many(self, indices):
+            return [fs.Constraint(x(index) <= 2, desc='Custom batched') for index in indices]
+
+    times = range(3)
+    node = Custom()
+    node.production[RESOURCE] = x
+    constraints = node.constraints.make_many(times)
+    assert {c.desc for c in constraints} == {'Custom balance'}
+    assert {c.expr for c in constraints} == {x(t) <= 1 for t in times}
+
+    node = CustomBatched()
+    constraints = node.constraints.make_many(times)
+    assert {c.desc for c in constraints} == {'Custom batched'}
+    assert len(constraints) == len(times)
+
+    node = Node()
+    node.production[RESOURCE] = x
+    assert len(node.constraints.make_many(times)) == len(times)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import raises, assert_raises
+
+import friendlysam as fs
+from friendlysam import compile_expression
+from friendlysam.util import get_list
+
+from friendlysam.tests import approx
+
+
+def _expressions():
+    x = fs.VariableCollection('x')
+    y = fs.Variable('y')
+    for i in range(5):
+        x(i).value = i + 0.5
+    y.value = -2
+    shared = x(1) * 3 - y
+    with fs.linear_form():
+        linear = 2 * x(3) + x(4) - 1
+    return [
+        x(0) + x(1) * 2,
+        shared * shared + shared,
+        fs.Sum([x(0), x(1), y, 4]),
+        fs.Sum([x(0)]) + 1,
+        linear,
+        linear * x(2),
+        x(2) <= 2 * x(1),
+        fs.Eq(x(1) + 1, x(2)),
+        x(1) < y,
+    ]
+
+
+def test_compiled_value():
+    for expr in _expressions():
+        compiled = compile_expression(expr)
+        assert compiled.value == expr.value
+        assert compiled.variables == expr.variables
+
+
+def test_compiled_evaluate():
+    x = fs.VariableCollection('x')
+    compiled = compile_expression(x(0) - 2 * x(1))
+    x(0).value = 1
+    assert compiled.evaluate({x(1): 3}) == -5
+    assert_raises(fs.NoValueError, lambda: compiled.value)
+    x(1).value = 1
+    assert compiled.value == -1
+
+
+def test_kernels_are_shared():
+    x = fs.VariableCollection('x')
+    a = compile_expression(x(0) * 2 + x(1))
+    b = compile_expression(x(2) * 5 + x(3))
+    c = compile_expression(x(2) * 5 - x(3))
+    assert a._kernel is b._kernel
+    assert a._kernel is not c._kernel
+
+
+def test_long_sums():
+    x = fs.VariableCollection('x')
+    n = 20000
+    for i in range(n):
+        x(i).value = 1
+    assert compile_expression(fs.Sum(x(i) for i in range(n))).value == n
+    with fs.linear_form():
+        linear = fs.Sum(2 * x(i) for i in range(n)) + 1
+    assert compile_expression(linear).value == 2 * n + 1
+    assert get_list(lambda t: fs.Sum(x(i) * t for i in range(n)), range(3)) == [0, n, 2 * n]
+
+
+def test_kernel_cache_is_bounded():
+    x = fs.Variable('x')
+    x.value = 1
+    for i in range(fs.opt._KERNEL_CACHE_SIZE + 10):
+        compile_expression(fs.Sum([x] * (i + 2)))
+    assert fs.opt._kernel.cache_info().currsize == fs.opt._KERNEL_CACHE_SIZE
+
+
+def test_get_list():
+    s = fs.Storage('power', name='Battery')
+    for i in range(11):
+        s.volume(i).value = i ** 2
+    func = lambda t: s.accumulation['power'](t) * (t % 3) + (1 if t < 5 else s.volume(t))
+    expected = [float(func(t)) for t in range(10)]
+    assert get_list(func, range(10)) == expected
+    assert get_list(lambda t: s.volume(t), range(3)) == [0, 1, 4]
+    assert_raises(fs.NoValueError, get_list, s.accumulation['power'], range(12))
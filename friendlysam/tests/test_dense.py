@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import raises, assert_raises
+
+import dill
+import numpy as np
+
+import friendlysam as fs
+
+from friendlysam.tests import default_solver, approx
+
+
+def test_dense_variables():
+    x = fs.VariableCollection('x', lb=0, ub=5, dense=True, domain=fs.Domain.integer)
+    v = x('a')
+    assert isinstance(v, fs.Variable)
+    assert x('a') is v
+    assert (v.name, v.lb, v.ub, v.domain) == ('x(a)', 0, 5, fs.Domain.integer)
+    assert not hasattr(v, 'value')
+    v.value = 3
+    assert v.value == 3
+    assert (v * 2).value == 6
+    del v.value
+    assert not hasattr(v, 'value')
+
+    v.lb, v.ub = None, 4
+    assert (v.lb, v.ub) == (None, 4)
+    x.lb = -1
+    assert x('a').lb is None
+    assert x('b').lb == -1
+
+
+def _update_bounds(dense):
+    # The same bound updates, with the bounds seen after each step and
+    # the solution of a problem with the final bounds.
+    x = fs.VariableCollection('x', lb=0, ub=5, dense=dense)
+    seen = []
+    def record():
+        seen.append([(x(i).lb, x(i).ub, x(i).domain) for i in x.indices])
+    x(0), x(1)
+    record()
+    x(0).lb = 2
+    x(1).ub = None
+    record()
+    x.lb, x.ub = -1, 3
+    x.domain = fs.Domain.integer
+    x(2)
+    record()
+    x(1).lb = None
+    x(2).ub = 2.5
+    record()
+
+    prob = fs.Problem()
+    prob.objective = fs.Maximize(x(0) + x(2) - x(1))
+    prob += (x(0) + x(1) <= 4, x(1) >= -3)
+    solution = default_solver.solve(prob)
+    return seen, [solution[x(i)] for i in x.indices]
+
+
+def test_bound_updates_dense_and_sparse():
+    seen, solution = _update_bounds(dense=False)
+    dense_seen, dense_solution = _update_bounds(dense=True)
+    assert dense_seen == seen
+    assert seen[-1] == [
+        (2, 5, fs.Domain.real), (None, None, fs.Domain.real), (-1, 2.5, fs.Domain.integer)]
+    assert all(approx(a, b) for a, b in zip(dense_solution, solution))
+    assert all(approx(a, b) for a, b in zip(solution, [5, -3, 2]))
+
+
+def test_bulk_values():
+    x = fs.VariableCollection('x', dense=True)
+    n = 100
+    solution = {x(i): i * 0.5 for i in range(n)}
+    x(n) # Not in solution
+    x.take_values(solution, indices=range(n))
+    values = x.values()
+    assert np.isnan(values[n])
+    assert np.allclose(values[:n], np.arange(n) * 0.5)
+    assert np.allclose(x.values([3, 1]), [1.5, 0.5])
+    assert x.indices == tuple(range(n + 1))
+    assert [v.value for v in x.variables[:n]] == [solution[x(i)] for i in range(n)]
+    assert_raises(KeyError, x.take_values, solution)
+
+
+def test_sparse_bulk_values():
+    x = fs.VariableCollection('x')
+    x.take_values({x(1): 1, x(2): 2}, indices=[1, 2])
+    x(3)
+    values = x.values()
+    assert np.allclose(values[:2], [1, 2])
+    assert np.isnan(values[2])
+
+
+def test_solve_dense():
+    x = fs.VariableCollection('x', lb=1, ub=3, dense=True)
+    prob = fs.Problem()
+    prob.objective = fs.Maximize(fs.Sum(x(i) for i in range(5)))
+    prob += (x(i) + x(i + 1) <= 5 for i in range(4))
+    solution = default_solver.solve(prob)
+    x.take_values(solution)
+    assert approx(sum(x.values()), 13)
+
+
+def test_dump_load_dense():
+    x = fs.VariableCollection('x', lb=0, dense=True)
+    x(1).value = 3
+    x(2).name = 'renamed'
+    expr = x(1) + x(2)
+    x, expr = dill.loads(dill.dumps((x, expr)))
+    assert x(1).value == 3
+    assert x(2).name == 'renamed'
+    assert expr == x(1) + x(2)
+    x(2).value = 4
+    assert expr.value == 7
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import raises, assert_raises
+
+import dill
+
+import friendlysam as fs
+
+
+def test_deep_chain():
+    x = fs.VariableCollection('x')
+    n = 20000
+    expr = sum(x(i) for i in range(n)) # A very deep tree of Add
+    values = {x(i): i for i in range(n)}
+    assert expr.evaluate(replace=values, evaluators=fs.CONCRETE_EVALUATORS) == sum(range(n))
+
+
+def test_shared_subtrees_evaluated_once():
+    x = fs.VariableCollection('x')
+    calls = []
+    def mul(a, b):
+        calls.append((a, b))
+        return a * b
+
+    shared = (x(1) + x(2)) * 3
+    expr = fs.Sum([shared, (x(1) + x(2)) * 3, shared * 2])
+    evaluators = fs.CONCRETE_EVALUATORS.copy()
+    evaluators[fs.Mul] = mul
+    assert expr.evaluate(replace={x(1): 1, x(2): 2}, evaluators=evaluators) == 36
+    assert len(calls) == 2
+
+
+def test_shared_subtree_in_deep_chain():
+    # The shared subtree is evaluated before evaluate() switches from
+    # recursion to a loop for the deep chain, and not again after that.
+    x = fs.VariableCollection('x')
+    calls = []
+    def mul(a, b):
+        calls.append((a, b))
+        return a * b
+
+    shared = (x(1) + x(2)) * 3
+    n = 1000
+    chain = shared
+    for i in range(n):
+        chain = chain + x(i)
+    evaluators = fs.CONCRETE_EVALUATORS.copy()
+    evaluators[fs.Mul] = mul
+    values = {x(i): i for i in range(n)}
+    assert (shared + chain).evaluate(replace=values, evaluators=evaluators) == 18 + sum(range(n))
+    assert len(calls) == 1
+
+
+def test_replace_operation():
+    x, y = fs.Variable('x'), fs.Variable('y')
+    expr = (x + y) * 2 + (x + y)
+    assert expr.evaluate(replace={x + y: 5}, evaluators=fs.CONCRETE_EVALUATORS) == 15
+
+
+def test_hash_after_pickling():
+    x = fs.VariableCollection('x')
+    expr = fs.Sum([x(1) * 2, x(2) + 1])
+    loaded = dill.loads(dill.dumps(expr))
+    assert hash(loaded) == hash(fs.Sum(loaded.args))
+    assert loaded == fs.Sum(loaded.args)
+
+
+def test_hash_of_deep_chain():
+    # Hashes are computed on first use, without recursion.
+    x = fs.VariableCollection('x')
+    n = 20000
+    first = sum(x(i) for i in range(n))
+    second = sum(x(i) for i in range(n))
+    assert first is not second
+    assert hash(first) == hash(second)
+
+
+def test_cached_variables_and_leaves():
+    x = fs.VariableCollection('x')
+    inner = x(1) * 2 + x(2)
+    expr = fs.Sum([inner, inner * x(3), 5])
+    assert expr.leaves == {x(1), x(2), x(3), 2, 5}
+    assert expr.variables == {x(1), x(2), x(3)}
+    assert expr.variables is expr.variables
+    assert inner.variables == {x(1), x(2)}
+
+
+def test_variables_of_deep_chain():
+    x = fs.VariableCollection('x')
+    n = 20000
+    expr = sum(x(i) for i in range(n))
+    assert len(expr.variables) == n
+
+
+def test_interned():
+    x = fs.VariableCollection('x')
+    assert x(1) + x(2) is not x(1) + x(2)
+    with fs.interning():
+        expr = (x(1) + x(2)) * 3
+        assert (x(1) + x(2)) * 3 is expr
+        assert expr.args[0] is x(1) + x(2)
+        assert fs.Sum([expr, 1]) is fs.Sum([expr, 1])
+
+        # Equal, but not the same
+        assert (x(1) + x(2)) * 3.0 is not expr
+        assert (x(1) + x(2)) * 3.0 == expr
+        assert x(1) + x(2) is not x(2) + x(1)
+
+        with fs.interning(False):
+            assert (x(1) + x(2)) * 3 is not expr
+
+
+def test_interned_linear_expr():
+    x = fs.VariableCollection('x')
+    with fs.linear_form(), fs.interning():
+        expr = 2 * x(1) + x(2)
+        same = 2 * x(1) + x(2)
+    assert same is expr
+    assert same.terms == {x(1): 2, x(2): 1}
+    assert fs.LinearExpr({x(2): 1, x(1): 2}) == expr
+
+
+def test_interned_table_is_purged():
+    x = fs.Variable('x')
+    with fs.interning():
+        for i in range(5 * fs.opt._interned_limit):
+            x + i
+    assert len(fs.opt._interned) <= 2 * fs.opt._interned_limit
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import raises, assert_raises
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import product
+
+import friendlysam as fs
+from friendlysam import Cluster
+
+from friendlysam.tests import default_solver, approx
+from friendlysam.tests.simple_models import Producer, Consumer, RESOURCE
+
+
+def test_collapse():
+    x, y = fs.Variable('x'), fs.Variable('y')
+    with fs.linear_form():
+        expr = 3 * (x + 2 * y) - x / 2 - y + 4
+        assert isinstance(expr, fs.LinearExpr)
+        assert expr == fs.LinearExpr({x: 2.5, y: 5}, 4)
+        assert expr.variables == {x, y}
+
+        assert fs.Sum([x, y, x]) == fs.LinearExpr({x: 2, y: 1})
+        assert fs.dot([1, 2], [x, y]) == fs.LinearExpr({x: 1, y: 2})
+        assert x - x == 0
+        assert (x + y) - y is x
+
+
+def test_accumulate():
+    x = fs.VariableCollection('x')
+    with fs.linear_form():
+        expr = 0
+        for i in range(5):
+            expr += (i + 1) * x(i)
+        assert expr == fs.LinearExpr({x(i): i + 1 for i in range(5)})
+
+        # Extending an expression does not change it, or other extensions
+        a = x(0) + x(1)
+        b = a + x(2)
+        c = a - x(3) + 1
+        d = b + 2 * x(0)
+        e = a + a
+        assert a.terms == {x(0): 1, x(1): 1}
+        assert b.terms == {x(0): 1, x(1): 1, x(2): 1}
+        assert c.terms == {x(0): 1, x(1): 1, x(3): -1} and c.constant == 1
+        assert d.terms == {x(0): 3, x(1): 1, x(2): 1}
+        assert e == 2 * a
+        assert hash(b) == hash(fs.LinearExpr({x(2): 1, x(1): 1, x(0): 1}))
+
+        # Still canonical
+        assert b - x(2) - x(1) is x(0)
+        assert isinstance(b - x(2) - x(1) + 1, fs.LinearExpr)
+        assert (b - x(2)).terms == {x(0): 1, x(1): 1}
+
+
+def test_accumulate_scales_linearly():
+    def build(n):
+        x = fs.VariableCollection('x')
+        start = time.perf_counter()
+        with fs.linear_form():
+            expr = 0
+            for i in range(n):
+                expr += x(i)
+            hash(expr)
+        return time.perf_counter() - start
+    small, large = min(build(2000) for i in range(3)), min(build(16000) for i in range(3))
+    assert large < 8 * small * 3 # Quadratic would be 64 times
+
+
+def test_threads():
+    x, y = fs.Variable('x'), fs.Variable('y')
+    entered = threading.Barrier(2)
+    results = []
+
+    def build(linear):
+        with fs.linear_form(linear):
+            entered.wait()
+            results.append((linear, x + y))
+            entered.wait()
+
+    threads = [threading.Thread(target=build, args=(linear,)) for linear in (True, False)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for linear, expr in results:
+        assert isinstance(expr, fs.LinearExpr if linear else fs.Add)
+    assert isinstance(x + y, fs.Add)
+
+
+def test_executor_threads():
+    x = fs.VariableCollection('x')
+    part = fs.Part()
+    part.constraints += lambda t: x(t) + x(t + 1) <= 1
+    with ThreadPoolExecutor(2) as executor:
+        with fs.linear_form():
+            constraints = part.constraints.make_many(range(4), executor=executor)
+        assert all(isinstance(c.expr.args[0], fs.LinearExpr) for c in constraints)
+        constraints = part.constraints.make_many(range(4), executor=executor)
+        assert all(isinstance(c.expr.args[0], fs.Add) for c in constraints)
+
+
+def test_nonlinear_fallback():
+    x, y = fs.Variable('x'), fs.Variable('y')
+    with fs.linear_form():
+        expr = (x + 1) * y
+        assert isinstance(expr, fs.Mul)
+        assert isinstance(fs.Sum([x, expr]), fs.Sum)
+        assert isinstance(fs.dot([x, 2], [y, y]), fs.Sum)
+
+
+def test_off_by_default():
+    x, y = fs.Variable('x'), fs.Variable('y')
+    assert isinstance(x + y, fs.Add)
+    with fs.linear_form():
+        with fs.linear_form(False):
+            assert isinstance(x + y, fs.Add)
+        assert isinstance(x + y, fs.LinearExpr)
+    assert isinstance(x + y, fs.Add)
+
+
+def test_evaluate():
+    x, y = fs.Variable('x'), fs.Variable('y')
+    expr = fs.LinearExpr({x: 2, y: 3}, 1)
+    tree = 2 * x + 3 * y + 1
+    assert expr.evaluate(replace={x: 1, y: 2}) == 9
+    x.value, y.value = 1.5, -2
+    assert approx(expr.value, tree.value)
+    assert approx(float(expr <= 0), 1)
+
+
+def solve_model(times):
+    consumption = lambda t: t * 1.5
+    p = Producer(name='Producer')
+    c = Consumer(consumption, name='Consumer')
+    cl = Cluster(p, c, resource=RESOURCE, name='Cluster')
+
+    prob = fs.Problem()
+    prob += (part.constraints.make(t) for part, t in product(cl.descendants_and_self, times))
+    prob.objective = fs.Minimize(fs.Sum(p.cost(t) for t in times))
+
+    solution = default_solver.solve(prob)
+    for t in times:
+        p.activity(t).take_value(solution)
+    return [p.production[RESOURCE](t).value for t in times]
+
+
+def test_solve_same_as_tree():
+    times = range(5)
+    tree_result = solve_model(times)
+    with fs.linear_form():
+        linear_result = solve_model(times)
+    for a, b in zip(tree_result, linear_result):
+        assert approx(a, b)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import raises, assert_raises
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from itertools import product
+
+import friendlysam as fs
+from friendlysam import Cluster
+
+from friendlysam.tests import default_solver, approx
+from friendlysam.tests.simple_models import Producer, Consumer, RESOURCE
+
+
+def _make_model():
+    consumption = lambda t: t * 1.5
+    p = Producer(name='Producer')
+    c = Consumer(consumption, name='Consumer')
+    cl = Cluster(p, c, resource=RESOURCE, name='Cluster')
+    return cl
+
+
+def test_make_many_order():
+    x = fs.VariableCollection('x')
+    part = fs.Part()
+    part.constraints += lambda t: x(t) <= t
+    part.constraints += lambda t: [x(t) >= -t, x(t) <= 2 * t]
+    constraints = part.constraints.make_many([2, 1])
+    assert [str(c.expr) for c in constraints] == [
+        'x(2) <= 2', '-2 <= x(2)', 'x(2) <= 4',
+        'x(1) <= 1', '-1 <= x(1)', 'x(1) <= 2']
+
+
+def _exprs(constraints):
+    return [c.expr for c in constraints]
+
+
+def test_make_many_threads():
+    cl = _make_model()
+    times = range(50)
+    serial = cl.make_constraints(times)
+    with ThreadPoolExecutor(4) as executor:
+        threaded = cl.make_constraints(times, executor=executor)
+    assert _exprs(threaded) == _exprs(serial)
+    expected = set.union(*(p.constraints.make(t) for p, t in product(cl.descendants_and_self, times)))
+    assert set(_exprs(serial)) == set(_exprs(expected))
+
+    for part in cl.descendants_and_self:
+        with ThreadPoolExecutor(4) as executor:
+            threaded = part.constraints.make_many(times, executor=executor)
+        assert _exprs(threaded) == _exprs(part.constraints.make_many(times))
+
+
+@raises(ValueError)
+def test_make_many_processes():
+    cl = _make_model()
+    with ProcessPoolExecutor(1) as executor:
+        cl.make_constraints(range(3), executor=executor)
+
+
+def test_variables_from_threads():
+    x = fs.VariableCollection('x')
+    y = fs.VariableCollection('y', dense=True)
+    indices = list(range(200)) * 4
+    with ThreadPoolExecutor(8) as executor:
+        xs = list(executor.map(x, indices))
+        ys = list(executor.map(y, indices))
+    assert len(set(xs)) == 200
+    assert len(set(ys)) == 200
+    assert all(x(i) is v for i, v in zip(indices, xs))
+    assert all(y(i) is v for i, v in zip(indices, ys))
+    assert sorted(y.indices) == list(range(200))
+
+
+def test_myopic_dispatch_executor():
+    cl = _make_model()
+    with ThreadPoolExecutor(2) as executor:
+        m = fs.models.MyopicDispatchModel(t0=0, step=3, horizon=7, executor=executor)
+        m.require_cost = lambda part: part is not cl
+        m.add_part(cl)
+        m.solver = default_solver
+        m.advance()
+        m.advance()
+
+
+class BatchedPart(fs.Part):
+    def __init__(self):
+        self.x = fs.VariableCollection('x')
+        self.calls = []
+        self.constraints += self.bounds
+
+    @fs.batched
+    def bounds(self, indices):
+        self.calls.append(indices)
+        with fs.linear_form():
+            return [self.x(t) <= 2 * t for t in indices]
+
+
+def test_batched():
+    part = BatchedPart()
+    part.constraints += lambda t: part.x(t) >= 0
+    constraints = part.make_constraints(range(3))
+    assert part.calls == [(0, 1, 2)]
+    assert [str(c.expr) for c in constraints] == [
+        '0 <= x(0)', '0 <= x(1)', '0 <= x(2)',
+        'x(0) <= 0', 'x(1) <= 2', 'x(2) <= 4']
+    assert constraints[-1].origin.index == (0, 1, 2)
+    assert constraints[-1].origin.func == part.bounds
+
+    constraints = part.constraints.make(5)
+    assert part.calls[-1] == (5,)
+    assert len(constraints) == 2
+
+    with ThreadPoolExecutor(2) as executor:
+        threaded = part.constraints.make_many(range(3), executor=executor)
+    assert part.calls[-1] == (0, 1, 2)
+    assert [str(c.expr) for c in threaded] == [
+        '0 <= x(0)', '0 <= x(1)', '0 <= x(2)',
+        'x(0) <= 0', 'x(1) <= 2', 'x(2) <= 4']
+
+
+def test_batched_bound_method():
+    part = fs.Part()
+    x = fs.VariableCollection('x')
+    class Bounds(object):
+        def bounds(self, indices):
+            return [x(t) <= t for t in indices]
+    part.constraints += fs.batched(Bounds().bounds)
+    assert len(part.constraints.make_many(range(4))) == 4
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import raises, assert_raises
+
+import numpy as np
+from scipy.optimize import milp, LinearConstraint, Bounds
+
+import friendlysam as fs
+from friendlysam.solvers.matrix import compile_problem
+
+from friendlysam.tests import default_solver, approx
+
+
+def _solve_matrix(mp):
+    lower = np.where(mp.sense == 'E', mp.b, -np.inf)
+    sign = -1 if mp.maximize else 1
+    result = milp(
+        sign * mp.c,
+        constraints=LinearConstraint(mp.A, lower, mp.b),
+        bounds=Bounds(mp.lb, mp.ub),
+        integrality=mp.integrality)
+    assert result.success
+    return mp.solution(result.x)
+
+
+def test_compile_matches_pulp():
+    x = fs.VariableCollection('x', lb=0, ub=10)
+    y = fs.VariableCollection('y', lb=0, dense=True, domain=fs.Domain.integer)
+    z = fs.Variable('z', domain=fs.Domain.binary)
+    indices = range(5)
+
+    prob = fs.Problem()
+    prob.objective = fs.Maximize(fs.Sum(x(i) + 2 * y(i) for i in indices) + 3 * z - 1)
+    prob += (fs.Constraint(x(i) + y(i) <= 4 + i) for i in indices)
+    prob += (fs.Constraint(fs.Eq(x(i) - 0.5 * y(i), 1)) for i in indices)
+    prob += fs.Constraint(fs.Sum(y(i) for i in indices) + 5 * z <= 12)
+
+    mp = compile_problem(prob)
+    assert mp.shape == (11, 11)
+    assert mp.maximize
+    assert mp.c0 == -1
+    assert z in mp.variables
+    j = mp.variables.index(z)
+    assert (mp.lb[j], mp.ub[j], mp.integrality[j]) == (0, 1, 1)
+
+    matrix_solution = _solve_matrix(mp)
+    pulp_solution = default_solver.solve(prob)
+    def objective_value(solution):
+        return prob.objective.expr.evaluate(solution, evaluators=fs.CONCRETE_EVALUATORS)
+    assert approx(objective_value(matrix_solution), objective_value(pulp_solution))
+
+
+def test_values_are_constants():
+    x, y = fs.Variable('x', lb=0), fs.Variable('y', lb=0)
+    y.value = 2
+    prob = fs.Problem()
+    prob.objective = fs.Minimize(x + y)
+    prob += fs.Constraint(x * y >= 3)
+    prob += fs.Constraint(y <= 3) # Trivially true, left out
+    mp = compile_problem(prob)
+    assert mp.variables == (x,)
+    assert mp.shape == (1, 1)
+    assert mp.A.toarray().tolist() == [[-2]]
+    assert mp.b.tolist() == [-3]
+    assert mp.c0 == 2
+
+
+def test_unused_variables_and_sos():
+    vs = [fs.Variable(lb=0, ub=1) for i in range(3)]
+    prob = fs.Problem()
+    prob.objective = fs.Minimize(vs[0])
+    prob += fs.SOS2(vs)
+    mp = compile_problem(prob)
+    assert mp.shape == (0, 3)
+    level, columns = mp.sos[0]
+    assert level == 2
+    assert [mp.variables[j] for j in columns] == vs
+
+
+def test_bad_constraints():
+    x = fs.Variable('x')
+    prob = fs.Problem()
+    prob.objective = fs.Minimize(x)
+
+    prob.add(fs.Constraint(x * x <= 1))
+    assert_raises(fs.ConstraintError, compile_problem, prob)
+
+    prob.constraints.clear()
+    prob.add(fs.Constraint(x < 1))
+    assert_raises(fs.ConstraintError, compile_problem, prob)
+
+    prob.constraints.clear()
+    x.value = 2
+    prob.add(fs.Constraint(x <= 1))
+    assert_raises(fs.ConstraintError, compile_problem, prob)
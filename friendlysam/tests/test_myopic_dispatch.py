@@ -25,3 +25,150 @@ def test_myopic_dispatch_simple():
     m.solver = default_solver
     m.advance()
     m.advance()
+
+
+def _run_with_storage(reuse_constraints, advances=5, warm_start=False):
+    calls = []
+    def consumption(t):
+        calls.append(t)
+        return 1 + t % 2
+    p = Producer(name='Producer')
+    p.cost = lambda t: (1 + t % 3) * p.activity(t)
+    c = Consumer(consumption, name='Consumer')
+    s = fs.Storage(RESOURCE, capacity=10, name='Storage')
+    s.constraints += lambda t: [fs.Eq(s.volume(0), 0)] if t == 0 else []
+    cl = Cluster(p, c, s, resource=RESOURCE, name='Cluster')
+
+    m = fs.models.MyopicDispatchModel(
+        t0=0, step=2, horizon=6, reuse_constraints=reuse_constraints, warm_start=warm_start)
+    m.require_cost = lambda part: part is p
+    m.add_part(cl)
+    m.solver = default_solver
+    for i in range(advances):
+        m.advance()
+    times = range(advances * m.step)
+    values = [(p.activity(t).value, s.volume(t).value) for t in times]
+    return values, calls
+
+
+def test_reuse_constraints():
+    reused, reused_calls = _run_with_storage(True)
+    regenerated, regenerated_calls = _run_with_storage(False)
+    for (a1, v1), (a2, v2) in zip(reused, regenerated):
+        assert approx(a1, a2)
+        assert approx(v1, v2)
+    assert len(regenerated_calls) == 5 * 6
+    # Each time step is made once, when it enters the horizon.
+    assert sorted(reused_calls) == list(range(4 * 2 + 6))
+
+
+def test_reuse_constraints_changed_funcs():
+    x = fs.VariableCollection('x', lb=0)
+    part = fs.Part()
+    part.cost = lambda t: -x(t)
+    part.state_variables = lambda t: (x(t),)
+    part.constraints += lambda t: x(t) <= 1
+    m = fs.models.MyopicDispatchModel(t0=0, step=1, horizon=2, reuse_constraints=True)
+    m.add_part(part)
+    m.solver = default_solver
+    m.advance()
+    assert x(0).value == 1
+    part.constraints += lambda t: x(t) <= 0.5
+    m.advance()
+    assert x(1).value == 0.5
+
+
+def test_constraints_made_again_by_default():
+    # Changes that the constraint cache does not notice, like an attribute
+    # read by a constraint function, take effect unless reuse_constraints
+    # is turned on.
+    x = fs.VariableCollection('x', lb=0)
+    part = fs.Part()
+    part.limit = 1
+    part.cost = lambda t: -x(t)
+    part.state_variables = lambda t: (x(t),)
+    part.constraints += lambda t: x(t) <= part.limit
+    m = fs.models.MyopicDispatchModel(t0=0, step=1, horizon=2)
+    m.add_part(part)
+    m.solver = default_solver
+    m.advance()
+    part.limit = 0.5
+    m.advance()
+    assert x(0).value == 1
+    assert x(1).value == 0.5
+
+
+def _run_changing_model(reuse_constraints, change):
+    p = Producer(name='Producer') # Produces 2 * activity
+    c = Node(name='Consumer')
+    c.consumption[RESOURCE] = lambda t: 1.
+    c.state_variables = lambda t: ()
+    cl = Cluster(p, c, resource=RESOURCE, name='Cluster')
+    m = fs.models.MyopicDispatchModel(
+        t0=0, step=1, horizon=2, reuse_constraints=reuse_constraints)
+    m.require_cost = lambda part: part is p
+    m.add_part(cl)
+    m.solver = default_solver
+    m.advance()
+    change(p, c, cl)
+    m.advance()
+    m.advance()
+    return [p.activity(t).value for t in range(3)]
+
+
+def test_reuse_constraints_changed_consumption():
+    def change(p, c, cl):
+        c.consumption[RESOURCE] = lambda t: 2.
+    for reuse in (True, False):
+        activity = _run_changing_model(reuse, change)
+        assert all(approx(a, b) for a, b in zip(activity, [0.5, 1., 1.]))
+
+
+def test_reuse_constraints_changed_cluster():
+    extra = fs.VariableCollection('extra', lb=0, ub=0.5)
+    def change(p, c, cl):
+        other = Node(name='Other')
+        other.production[RESOURCE] = extra
+        other.state_variables = lambda t: (extra(t),)
+        cl.add_part(other)
+    activity = _run_changing_model(True, change)
+    assert all(approx(a, b) for a, b in zip(activity, [0.5, 0.25, 0.25]))
+
+
+def test_warm_start():
+    warm, calls = _run_with_storage(True, warm_start=True)
+    cold, calls = _run_with_storage(True)
+    for (a1, v1), (a2, v2) in zip(warm, cold):
+        assert approx(a1, a2)
+        assert approx(v1, v2)
+
+
+def _scenario_model(factor):
+    p = Producer(name='Producer')
+    c = Consumer(lambda t: factor * t, name='Consumer')
+    cl = Cluster(p, c, resource=RESOURCE, name='Cluster')
+    m = fs.models.MyopicDispatchModel(t0=0, step=2, horizon=4)
+    m.require_cost = lambda part: part is not cl
+    m.add_part(cl)
+    m.solver = fs.get_solver()
+    return m
+
+
+def test_run_scenarios():
+    scenarios = {'low': 1, 'high': 3}
+    results = fs.models.run_scenarios(
+        _scenario_model, scenarios, advances=2,
+        result=lambda m: [m.find('Producer').activity(t).value for t in range(4)],
+        max_workers=2, max_solvers=1)
+    results = dict(results)
+    assert set(results) == set(scenarios)
+    for name, factor in scenarios.items():
+        for t, activity in enumerate(results[name]):
+            assert approx(activity, factor * t / 2)
+
+    results = list(fs.models.run_scenarios(_scenario_model, [1], advances=1))
+    assert len(results) == 1
+    name, model = results[0]
+    assert name == 0
+    assert model.time == 2
+    assert model.solver is None
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import raises, assert_raises
+
+import friendlysam as fs
+from friendlysam import Part
+
+
+def _tree():
+    root, a, b, leaf = Part('root'), Part('a'), Part('b'), Part('leaf')
+    root.add_part(a)
+    root.add_part(b)
+    a.add_part(leaf)
+    b.add_part(leaf) # leaf has two parents
+    return root, a, b, leaf
+
+
+def test_cached_descendants():
+    root, a, b, leaf = _tree()
+    assert root.descendants == {a, b, leaf}
+    assert root.descendants is root.descendants
+    assert root.descendants_and_self is root.descendants_and_self
+    assert root.children is root.children
+    assert root.parts(depth=1) == {root, a, b}
+    assert root.parts(depth=2, include_self=False) == {a, b, leaf}
+
+    new = Part('new')
+    leaf.add_part(new)
+    assert root.descendants == {a, b, leaf, new}
+    assert a.descendants == {leaf, new}
+    assert leaf.children == {new}
+
+    a.remove_part(leaf)
+    assert a.descendants == frozenset()
+    assert root.descendants == {a, b, leaf, new}
+    b.remove_part(leaf)
+    assert root.descendants == {a, b}
+    assert leaf.descendants == {new}
+
+
+def test_cycles():
+    root, a, b, leaf = _tree()
+    assert_raises(fs.InsanityError, leaf.add_part, root)
+    assert_raises(fs.InsanityError, leaf.add_part, leaf)
+    assert_raises(fs.InsanityError, b.add_part, root)
+    a.add_part(b) # Not a cycle
+    assert a.descendants == {b, leaf}
+
+
+def test_deep_tree():
+    parts = [Part() for i in range(5000)]
+    for parent, child in reversed(list(zip(parts, parts[1:]))):
+        parent.add_part(child)
+    assert len(parts[0].descendants_and_self) == len(parts)
+    assert len(parts[0].parts(depth=10)) == 11
+
+
+def test_find():
+    root, a, b, leaf = _tree()
+    assert root.find('leaf') is leaf
+    assert a.find('leaf') is leaf
+    assert root.find_many(['b', 'root', 'leaf']) == [b, root, leaf]
+    assert_raises(ValueError, a.find, 'b')
+
+    leaf.name = 'renamed'
+    assert root.find('renamed') is leaf
+    assert a.find('renamed') is leaf
+    assert_raises(ValueError, root.find, 'leaf')
+
+    b.name = 'a'
+    assert_raises(ValueError, root.find, 'a')
+    assert_raises(ValueError, root.find_many, ['renamed', 'a'])
+
+    new = Part('new')
+    leaf.add_part(new)
+    assert root.find('new') is new
+    a.remove_part(leaf)
+    assert_raises(ValueError, a.find, 'new')
+    assert root.find('new') is new
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import raises, assert_raises
+
+import friendlysam as fs
+
+from friendlysam.tests import default_solver, approx
+
+
+def _make_problem(i):
+    x = fs.VariableCollection('x', lb=0, ub=10)
+    y = fs.VariableCollection('y', lb=-3, domain=fs.Domain.integer)
+    indices = range(4)
+    prob = fs.Problem()
+    prob.objective = fs.Maximize(fs.Sum(x(j) + 2 * y(j) for j in indices) - 1)
+    prob += (fs.Constraint(x(j) + y(j) <= 4 + j + i) for j in indices)
+    prob += (fs.Constraint(fs.Eq(x(j) - 0.5 * y(j), 1)) for j in indices)
+    return prob
+
+
+def _objective_value(prob, solution):
+    return prob.objective.expr.evaluate(solution, evaluators=fs.CONCRETE_EVALUATORS)
+
+
+def test_pool_solver():
+    problems = [_make_problem(i) for i in range(5)]
+    for processes in (2, 0):
+        solver = fs.get_solver('pool', dict(processes=processes))
+        solutions = solver.solve_many(problems)
+        assert approx(_objective_value(problems[0], solver.solve(problems[0])),
+            _objective_value(problems[0], solutions[0]))
+        solver.close()
+        for prob, solution in zip(problems, solutions):
+            reference = default_solver.solve(prob)
+            assert set(solution) == set(reference)
+            assert approx(_objective_value(prob, solution), _objective_value(prob, reference))
+
+
+def test_pool_solver_errors():
+    solver = fs.get_solver('pool', dict(processes=0))
+    x = fs.Variable('x', lb=0, ub=1)
+    prob = fs.Problem()
+    prob.objective = fs.Minimize(x)
+    prob += fs.Constraint(x >= 2)
+    assert_raises(fs.SolverError, solver.solve, prob)
+
+    prob = fs.Problem()
+    prob.objective = fs.Minimize(x)
+    prob += fs.SOS1([x, fs.Variable('y')])
+    assert_raises(fs.SolverError, solver.solve, prob)
+
+    assert_raises(ValueError, fs.get_solver, 'no such engine')
+
+
+def test_pool_solver_warm_start():
+    from friendlysam.tests.simple_models import Producer, Consumer, RESOURCE
+    p = Producer(name='Producer')
+    c = Consumer(lambda t: t, name='Consumer')
+    cl = fs.Cluster(p, c, resource=RESOURCE, name='Cluster')
+    m = fs.models.MyopicDispatchModel(t0=0, step=1, horizon=3, warm_start=True)
+    m.require_cost = lambda part: part is not cl
+    m.add_part(cl)
+    m.solver = fs.get_solver('pool', dict(processes=0))
+    m.advance()
+    m.advance() # Solves with a start, which is ignored
+    assert approx(p.activity(1).value, 0.5)
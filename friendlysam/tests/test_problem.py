@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import raises, assert_raises
+
+import dill
+
+import friendlysam as fs
+
+
+def test_variables():
+    x = fs.VariableCollection('x')
+    prob = fs.Problem()
+    prob.objective = fs.Minimize(x(1) + x(2))
+    c1 = fs.Constraint(x(2) + x(3) <= 1)
+    c2 = fs.Constraint(x(3) >= 0)
+    sos = fs.SOS1([x(4), x(5)])
+    prob.add(c1, c2, sos)
+    assert prob.variables == {x(i) for i in range(1, 6)}
+
+    prob.add(c1) # Already there
+    prob.remove(c1)
+    assert prob.variables == {x(1), x(2), x(3), x(4), x(5)}
+    prob.remove([c2, sos])
+    assert prob.variables == {x(1), x(2)}
+
+    prob.objective = fs.Maximize(x(6))
+    assert prob.variables == {x(6)}
+    assert len(prob.constraints) == 0
+
+
+def test_variables_without_value():
+    x = fs.VariableCollection('x')
+    prob = fs.Problem()
+    prob.objective = fs.Minimize(x(1))
+    prob += [x(1) + x(2) >= 1, x(2) <= x(3)]
+    assert prob.variables_without_value() == {x(1), x(2), x(3)}
+    x(2).value = 1
+    assert prob.variables_without_value() == {x(1), x(3)}
+    assert x(2) in prob.variables
+
+
+def test_change_constraints_directly():
+    x = fs.VariableCollection('x')
+    prob = fs.Problem()
+    prob.objective = fs.Minimize(x(1))
+    c = fs.Constraint(x(1) + x(2) >= 1)
+    prob.constraints.add(c)
+    assert prob.variables == {x(1), x(2)}
+    prob.constraints.discard(c)
+    assert prob.variables == {x(1)}
+    prob += [x(2) <= 1, x(3) <= 1]
+    prob.constraints.clear()
+    assert prob.variables == {x(1)}
+    assert_raises(KeyError, prob.constraints.remove, c)
+
+
+def test_set_methods():
+    x = fs.VariableCollection('x')
+    prob = fs.Problem()
+    prob.objective = fs.Minimize(x(0))
+    c = [fs.Constraint(x(i) <= i) for i in range(5)]
+
+    prob.constraints.update(c[:2], [c[2]])
+    assert prob.constraints == set(c[:3])
+    assert prob.variables == {x(0), x(1), x(2)}
+
+    copy = prob.constraints.copy()
+    assert type(copy) is set and copy == set(c[:3])
+    copy.add(c[4])
+    assert c[4] not in prob.constraints
+    assert prob.constraints.union([c[3]]) == set(c[:4])
+    assert prob.constraints | {c[3]} == set(c[:4])
+    assert prob.constraints.intersection(c[1:]) == {c[1], c[2]}
+    assert prob.constraints.difference([c[0]]) == {c[1], c[2]}
+    assert prob.constraints.symmetric_difference(c[2:4]) == {c[0], c[1], c[3]}
+    assert prob.constraints.issubset(c)
+    assert prob.constraints.issuperset(c[:2])
+    assert prob.constraints.isdisjoint(c[3:])
+    assert prob.variables == {x(0), x(1), x(2)}
+
+    prob.constraints.difference_update([c[1]], [c[2], c[4]])
+    assert prob.constraints == {c[0]}
+    assert prob.variables == {x(0)}
+
+    constraints = prob.constraints
+    constraints |= set(c[1:4])
+    prob.constraints.intersection_update(c[1:3], c[2:])
+    assert prob.constraints == {c[2]}
+    assert prob.variables == {x(0), x(2)}
+
+    prob.constraints.symmetric_difference_update(c[2:4])
+    assert prob.constraints == {c[3]}
+    assert prob.variables == {x(0), x(3)}
+
+    constraints -= {c[3]}
+    assert constraints is prob.constraints
+    assert prob.variables == {x(0)}
+
+
+@raises(KeyError)
+def test_remove_missing():
+    x = fs.Variable('x')
+    prob = fs.Problem()
+    prob.remove(fs.Constraint(x <= 1))
+
+
+def test_pickle():
+    x = fs.VariableCollection('x')
+    prob = fs.Problem()
+    prob.objective = fs.Minimize(x(1))
+    prob += x(1) + x(2) >= 1
+    loaded = dill.loads(dill.dumps(prob))
+    assert len(loaded.variables) == 2
+    assert loaded.variables == set(loaded.objective.variables) | next(iter(loaded.constraints)).variables
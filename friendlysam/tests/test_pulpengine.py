@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import raises, assert_raises
+
+import asyncio
+
+import friendlysam as fs
+
+from friendlysam.tests import approx
+
+
+def _check_solution(prob, solution):
+    reference = fs.get_solver(options=dict(incremental=False)).solve(prob)
+    assert set(solution) == set(reference)
+    objective = prob.objective.expr
+    assert approx(
+        objective.evaluate(solution, evaluators=fs.CONCRETE_EVALUATORS),
+        objective.evaluate(reference, evaluators=fs.CONCRETE_EVALUATORS))
+
+
+def test_incremental_resolve():
+    solver = fs.get_solver()
+    x = fs.VariableCollection('x', lb=0, ub=10)
+    indices = range(4)
+
+    prob = fs.Problem()
+    prob.objective = fs.Maximize(fs.Sum(x(i) for i in indices))
+    kept = [fs.Constraint(x(i) + x(i+1) <= 5) for i in indices[:-1]]
+    removed = fs.Constraint(x(0) <= 1)
+    prob += kept
+    prob += removed
+
+    _check_solution(prob, solver.solve(prob))
+    model = solver._model
+    last_name = solver._constraint_names[kept[-1].expr]
+    last_pulp_constraint = solver._pulp_constraints[last_name]
+    assert len(solver._pulp_constraints) == 4
+
+    # Remove one constraint, add another, change a bound and fix a variable.
+    prob.constraints.remove(removed)
+    prob += fs.Constraint(x(3) <= 2)
+    x(2).ub = 1
+    x(1).value = 4
+
+    solution = solver.solve(prob)
+    assert solver._model is not model # Rebuilt without the removed constraint
+    model = solver._model
+    _check_solution(prob, solution)
+    assert x(1) not in solution
+    assert approx(sum(solution.values()), 1 + 1 + 2)
+
+    # Constraints that did not change were kept as they were
+    assert solver._constraint_names[kept[-1].expr] == last_name
+    assert solver._pulp_constraints[last_name] is last_pulp_constraint
+    # Constraints with x(1), which got a value, were evaluated again
+    assert kept[0].expr not in solver._constraint_names
+    assert len(solver._pulp_constraints) == model.numConstraints() == 4
+
+
+def test_removed_variables():
+    solver = fs.get_solver()
+    x, y = fs.Variable('x', ub=3), fs.Variable('y', ub=3)
+    prob = fs.Problem()
+    prob.objective = fs.Maximize(x)
+    only_y = fs.Constraint(x + y <= 4)
+    prob += [fs.Constraint(x <= 2), only_y]
+    assert solver.solve(prob)[x] == 2
+    model = solver._model
+    pulp_y = solver._last_problem_vars[y]
+    assert pulp_y.name in {v.name for v in model.variables()}
+
+    prob.constraints.remove(only_y)
+    assert solver.solve(prob) == {x: 2}
+    assert pulp_y.name not in {v.name for v in solver._model.variables()}
+
+    # Without removed constraints, the model is kept
+    model = solver._model
+    prob += fs.Constraint(x <= 1)
+    assert solver.solve(prob) == {x: 1}
+    assert solver._model is model
+
+
+def test_not_incremental():
+    solver = fs.get_solver(options=dict(incremental=False))
+    x = fs.Variable('x', ub=3)
+    prob = fs.Problem()
+    prob.objective = fs.Maximize(x)
+    prob += fs.Constraint(x <= 2)
+    solver.solve(prob)
+    model = solver._model
+    assert solver.solve(prob)[x] == 2
+    assert solver._model is not model
+
+
+def test_sense_change():
+    solver = fs.get_solver()
+    x = fs.Variable('x', lb=-1, ub=3)
+    prob = fs.Problem()
+    prob += fs.Constraint(x <= 2)
+    prob.objective = fs.Maximize(x)
+    assert solver.solve(prob)[x] == 2
+    prob.objective = fs.Minimize(x)
+    assert solver.solve(prob)[x] == -1
+
+
+def test_recovers_after_error():
+    solver = fs.get_solver()
+    x = fs.Variable('x', ub=3)
+    y = fs.Variable('y')
+    y.value = 1
+    prob = fs.Problem()
+    prob.objective = fs.Maximize(x)
+    prob += fs.Constraint(x <= 2)
+    prob += fs.Constraint(y >= 2)
+    assert_raises(fs.ConstraintError, solver.solve, prob)
+    y.value = 2
+    assert solver.solve(prob)[x] == 2
+
+
+def test_start():
+    solver = fs.get_solver()
+    x = fs.VariableCollection('x', lb=0, ub=10, domain=fs.Domain.integer)
+    prob = fs.Problem()
+    prob.objective = fs.Maximize(x(0) + 2 * x(1))
+    prob += fs.Constraint(x(0) + x(1) <= 7.5)
+    other = fs.Variable('other')
+    solution = solver.solve(prob, start={x(0): 3, x(1): 20, other: 1})
+    assert solution == {x(0): 0, x(1): 7}
+    assert solver._last_problem_vars[x(0)].varValue == 0
+
+
+def test_start_without_warm_start_support():
+    from friendlysam.solvers import pulpengine
+    solver = fs.get_solver()
+    x = fs.VariableCollection('x', lb=0, ub=10, domain=fs.Domain.integer)
+    prob = fs.Problem()
+    prob.objective = fs.Maximize(x(0) + 2 * x(1))
+    prob += fs.Constraint(x(0) + x(1) <= 7.5)
+    has_warm_start = pulpengine._HAS_WARM_START
+    pulpengine._HAS_WARM_START = False # Like PuLP < 2.0
+    try:
+        solution = solver.solve(prob, start={x(0): 3, x(1): 4})
+    finally:
+        pulpengine._HAS_WARM_START = has_warm_start
+    assert solution == {x(0): 0, x(1): 7}
+    assert solver._last_problem_vars[x(1)].varValue == 7
+
+
+def _async_problem(i):
+    x = fs.VariableCollection('x', lb=0, ub=10, domain=fs.Domain.integer)
+    prob = fs.Problem()
+    prob.objective = fs.Maximize(x(0) + 2 * x(1) - x(2))
+    prob += fs.Constraint(x(0) + x(1) <= 7.5 + i)
+    prob += fs.Constraint(x(0) - x(2) <= -1)
+    return prob
+
+
+def test_solve_async():
+    solver = fs.get_solver()
+    problems = [_async_problem(i) for i in range(4)]
+
+    async def solve_all():
+        return await asyncio.gather(*(solver.solve_async(p) for p in problems))
+
+    solutions = asyncio.run(solve_all())
+    for prob, solution in zip(problems, solutions):
+        reference = solver.solve(prob)
+        assert set(solution) == set(reference)
+        for v in solution:
+            assert approx(solution[v], reference[v])
+
+
+def test_solve_async_infeasible():
+    prob = _async_problem(0)
+    x = next(iter(prob.variables_without_value()))
+    prob += fs.Constraint(x >= 11)
+    assert_raises(fs.SolverError, asyncio.run, fs.get_solver().solve_async(prob))
@@ -57,3 +57,33 @@ def test_load_and_run():
     for t in TIMES_1 + TIMES_2:
         assert approx(p.production[RESOURCE](t).value, consumption(t))
         assert approx(c.consumption[RESOURCE](t).value, consumption(t))
+
+
+def test_compact_objects():
+    x = fs.Variable('x', lb=1, ub=2)
+    expr = x * 2 + 1
+    constraint = fs.Constraint(expr <= 3, desc='Some text')
+    sos = fs.SOS1([x])
+    for obj in (x, expr, expr.args[0], constraint, constraint.expr, sos):
+        assert not hasattr(obj, '__dict__')
+
+
+def test_dump_load_compact_objects():
+    x = fs.Variable('x', lb=1, ub=2, domain=fs.Domain.integer)
+    x.value = 1.5
+    y = fs.Variable('y')
+    constraint = fs.Constraint(x * 2 + y <= 3, desc='Some text', origin='test')
+
+    x, y, constraint = dill.loads(dill.dumps((x, y, constraint)))
+    assert (x.name, x.lb, x.ub, x.domain, x.value) == ('x', 1, 2, fs.Domain.integer, 1.5)
+    assert not hasattr(y, 'value')
+    assert (constraint.desc, constraint.origin) == ('Some text', 'test')
+    assert constraint.expr == (x * 2 + y <= 3)
+    assert constraint.variables == {x, y}
+
+
+def test_dump_load_deferred_desc():
+    p = Producer(name='Producer')
+    constraint = p.balance_constraints_many([0])[0]
+    loaded = dill.loads(dill.dumps(constraint))
+    assert loaded.desc == constraint.desc == 'Balance constraint (resource={})'.format(RESOURCE)
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import raises, assert_raises
+
+import pickle
+
+import numpy as np
+
+import friendlysam as fs
+from friendlysam import Solution
+
+from friendlysam.tests import default_solver, approx
+
+
+def test_mapping():
+    x = fs.VariableCollection('x')
+    y = fs.Variable('y')
+    solution = Solution([x(0), y, x(1)], [1, 2, 3])
+    assert len(solution) == 3
+    assert list(solution) == [x(0), y, x(1)]
+    assert solution == {x(0): 1, y: 2, x(1): 3}
+    assert solution[y] == 2
+    assert y in solution
+    assert x(2) not in solution
+    assert_raises(KeyError, solution.__getitem__, x(2))
+    assert solution.get(x(2)) is None
+    assert_raises(ValueError, Solution, [y], [1, 2])
+
+
+def test_to_numpy():
+    x = fs.VariableCollection('x')
+    y = fs.VariableCollection('y', dense=True)
+    variables = [x(0), y(0), x(1), y(1)]
+    solution = Solution(variables, [1, 2, 3, 4])
+    values = solution.to_numpy()
+    assert np.array_equal(values, [1, 2, 3, 4])
+    values[0] = 10
+    assert solution[x(0)] == 1
+    assert np.array_equal(solution.to_numpy(x), [1, 3])
+    assert np.array_equal(solution.to_numpy([y(1), x(0)]), [4, 1])
+    assert_raises(KeyError, solution.to_numpy, [x(5)])
+
+    y.take_values(solution)
+    assert np.array_equal(y.values(), [2, 4])
+    assert_raises(KeyError, y.take_values, Solution([y(0)], [1]))
+
+
+def test_duals_and_reduced_costs():
+    x, y, z = fs.Variable('x', lb=0), fs.Variable('y', lb=0), fs.Variable('z', lb=0)
+    prob = fs.Problem()
+    prob.objective = fs.Maximize(x + y - z)
+    c1 = fs.Constraint(x + 2 * y <= 4)
+    c2 = fs.Constraint(3 * x + y <= 6)
+    prob += [c1, c2]
+    solution = default_solver.solve(prob)
+    assert isinstance(solution, Solution)
+    assert approx(solution[x], 1.6)
+    assert approx(solution[y], 1.2)
+    assert approx(solution.duals[c1], 0.4)
+    assert approx(solution.duals[c2], 0.2)
+    assert approx(solution.reduced_costs[z], -1)
+
+
+def test_pickle():
+    x = fs.Variable('x')
+    solution = pickle.loads(pickle.dumps(Solution([x], [1.5])))
+    assert list(solution.values()) == [1.5]
+
+
+def test_apply_solution():
+    x = fs.VariableCollection('x')
+    y = fs.VariableCollection('y', dense=True)
+    solution = Solution([x(0), y(0), x(1)], [1, 2, 3])
+
+    try:
+        fs.apply_solution(solution, [x(0), x(5), y(5)])
+    except KeyError as e:
+        assert '2 variables' in str(e)
+    else:
+        assert False
+    assert not hasattr(x(0), 'value')
+
+    assert fs.apply_solution(solution, [x(0), y(5)], ignore_missing=True) == [y(5)]
+    assert x(0).value == 1
+    assert not hasattr(y(5), 'value')
+
+    assert y.apply_solution(solution, ignore_missing=True) == [y(5)]
+    assert y(0).value == 2
+    assert_raises(KeyError, y.apply_solution, {y(0): 1})
+    assert y(0).value == 2
+    assert x.apply_solution({x(0): 4, x(1): 5, x(5): 6}) == []
+    assert x(5).value == 6
+
+
+def test_apply_solution_problem_and_part():
+    x = fs.VariableCollection('x')
+    prob = fs.Problem()
+    prob.objective = fs.Minimize(x(0) + x(1))
+    prob += fs.Constraint(x(0) >= 1)
+    prob += fs.Constraint(x(1) >= 2)
+    solution = default_solver.solve(prob)
+    assert prob.apply_solution(solution) == []
+    assert (x(0).value, x(1).value) == (1, 2)
+
+    parent, child = fs.Part(), fs.Part()
+    parent.add_part(child)
+    y = fs.VariableCollection('y')
+    parent.state_variables = lambda t: (x(t),)
+    child.state_variables = lambda t: (y(t),)
+    solution = {x(2): 1, x(3): 2, y(2): 3}
+    assert_raises(KeyError, parent.apply_solution, solution, range(2, 4))
+    assert parent.apply_solution(solution, range(2, 4), ignore_missing=True) == [y(3)]
+    assert (x(2).value, x(3).value, y(2).value) == (1, 2, 3)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import raises, assert_raises
+
+import os
+import shutil
+import subprocess
+import tempfile
+
+import pulp
+
+import friendlysam as fs
+
+from friendlysam.tests import default_solver, approx
+
+
+def _cbc_objective(path, maximize):
+    # Solve a problem file with the CBC binary that comes with pulp.
+    directory = os.path.dirname(path)
+    solution_path = os.path.join(directory, 'solution.txt')
+    args = [pulp.PULP_CBC_CMD().path, path]
+    if maximize:
+        args.append('max')
+    args += ['solve', 'solution', solution_path]
+    subprocess.check_output(args)
+    with open(solution_path) as f:
+        status_line = f.readline()
+    assert status_line.startswith('Optimal')
+    return float(status_line.split()[-1])
+
+
+def _make_problem():
+    x = fs.VariableCollection('x', lb=0, ub=10)
+    y = fs.VariableCollection('y', lb=-3, domain=fs.Domain.integer)
+    z = fs.Variable('z', domain=fs.Domain.binary)
+    w = [fs.Variable(lb=0, ub=2) for i in range(3)]
+    free = fs.Variable('free')
+    indices = range(5)
+
+    prob = fs.Problem()
+    prob.objective = fs.Maximize(
+        fs.Sum(x(i) + 2 * y(i) for i in indices) + 3 * z - 1 + w[1] - 0.5 * w[0])
+    prob += (fs.Constraint(x(i) + y(i) <= 4 + i) for i in indices)
+    prob += (fs.Constraint(fs.Eq(x(i) - 0.5 * y(i), 1)) for i in indices)
+    prob += fs.Constraint(fs.Sum(y(i) for i in indices) + 5 * z <= 12)
+    prob += fs.Constraint(fs.Sum(w) >= 1)
+    prob += fs.Constraint(free - free <= 1) # Only in the bounds section
+    prob += fs.SOS1(w)
+    return prob
+
+
+def test_write_lp_and_mps():
+    prob = _make_problem()
+    solution = default_solver.solve(prob)
+    expected = prob.objective.expr.evaluate(solution, evaluators=fs.CONCRETE_EVALUATORS)
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'problem.lp')
+        variables = prob.write_lp(path)
+        assert set(variables) == prob.variables_without_value()
+        assert approx(_cbc_objective(path, True), expected)
+
+        path = os.path.join(directory, 'problem.mps')
+        variables = prob.write_mps(path)
+        assert set(variables) == prob.variables_without_value()
+        assert approx(_cbc_objective(path, True), expected)
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_write_mps_objsense():
+    x = fs.Variable('x', lb=0, ub=1)
+    prob = fs.Problem()
+    prob.objective = fs.Maximize(x)
+    prob += fs.Constraint(x <= 2)
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'problem.mps')
+        prob.write_mps(path, objsense=True)
+        with open(path) as f:
+            assert f.read().startswith('OBJSENSE\n    MAX\n')
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_infeasible_constraint():
+    x = fs.Variable('x')
+    x.value = 2
+    prob = fs.Problem()
+    prob.objective = fs.Minimize(x)
+    prob += fs.Constraint(x <= 1)
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'problem.lp')
+        assert_raises(fs.ConstraintError, prob.write_lp, path)
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_write_lp_long_lines():
+    n = 400
+    x = [fs.Variable('x{}'.format(i), lb=0, ub=1) for i in range(n)]
+    prob = fs.Problem()
+    prob.objective = fs.Maximize(fs.Sum((i + 1.125) * x[i] for i in range(n)))
+    prob += fs.Constraint(fs.Sum((i % 7 + 0.5) * x[i] for i in range(n)) <= 3.5)
+    prob += fs.SOS1(x)
+    solution = default_solver.solve(prob)
+    expected = prob.objective.expr.evaluate(solution, evaluators=fs.CONCRETE_EVALUATORS)
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'problem.lp')
+        prob.write_lp(path)
+        with open(path) as f:
+            lines = f.read().splitlines()
+        assert len(lines) > 3 * 20
+        assert max(len(line) for line in lines) <= 510
+        assert approx(_cbc_objective(path, True), expected)
+    finally:
+        shutil.rmtree(directory)
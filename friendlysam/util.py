@@ -36,9 +36,16 @@ def get_list(func, indices):
         ...
         >>> get_list(s.accumulation['power'], range(4))
         [1.0, 3.0, 5.0, 7.0]
+
+    If NumPy is installed, expressions of the same shape, like
+    ``s.volume(t+1) - s.volume(t)`` for all ``t``, are compiled once
+    (see :func:`~friendlysam.opt.compile_expression`) and evaluated
+    together on arrays of variable values.
     """
 
-    return [float(func(index)) for index in indices]
+    if fs.opt.numpy is None:
+        return [float(func(index)) for index in indices]
+    return fs.opt._evaluate_many([func(index) for index in indices])
 
 def get_series(func, indices, **kwargs):
     """Get a pandas Series of function values at indices.
@@ -29,6 +29,8 @@ setup(
     ],
     extras_require = {
         'pandas':  ["pandas>=0.16.1"],
+        'numpy': ["numpy>=1.9"],
+        'scipy': ["numpy>=1.9", "scipy>=1.9"],
         'pickling': ["dill>=0.2.2"]
         },
     # See https://pypi.python.org/pypi?%3Aaction=list_classifiers